@@ -0,0 +1,255 @@
+"""
+Local stand-ins for Bedrock runtime and the BFL FLUX API
+
+All simulate latency with sleeps only, so they cost no CPU and need no network.
+"""
+
+import base64
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from botocore.exceptions import ClientError
+
+
+def sample_image(width: int = 512, height: int = 512, format: str = "PNG") -> bytes:
+    """A noisy image, so encoders do realistic work instead of compressing a flat color"""
+    from PIL import Image
+
+    noise = Image.effect_noise((width, height), 48).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buffer = io.BytesIO()
+    Image.blend(noise, gradient, 0.5).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+class FakeBedrockRuntime:
+    """
+    Drop-in for a bedrock-runtime client's invoke_model
+
+    Each call sleeps for the model family's latency (with +/-30% jitter). Calls
+    beyond max_concurrency per model, and a random throttle_rate fraction of the
+    rest, raise ThrottlingException like the real service.
+    """
+
+    def __init__(
+        self,
+        text_latency: float = 0.5,
+        image_latency: float = 1.5,
+        throttle_rate: float = 0.0,
+        max_concurrency: int = 8,
+    ):
+        self.text_latency = text_latency
+        self.image_latency = image_latency
+        self.throttle_rate = throttle_rate
+        self.max_concurrency = max_concurrency
+        self.image_base64 = base64.b64encode(sample_image()).decode("utf-8")
+        self.calls: Dict[str, int] = {}
+        self.throttles = 0
+        self._in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId: str, body: str, **kwargs):
+        with self._lock:
+            self.calls[modelId] = self.calls.get(modelId, 0) + 1
+            in_flight = self._in_flight.get(modelId, 0)
+            if in_flight >= self.max_concurrency or random.random() < self.throttle_rate:
+                self.throttles += 1
+                raise ClientError(
+                    {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+                    "InvokeModel",
+                )
+            self._in_flight[modelId] = in_flight + 1
+
+        try:
+            request = json.loads(body)
+            is_image = "taskType" in request or "text_prompts" in request
+            latency = self.image_latency if is_image else self.text_latency
+            time.sleep(latency * random.uniform(0.7, 1.3))
+            response = self._response(modelId, request)
+        finally:
+            with self._lock:
+                self._in_flight[modelId] -= 1
+
+        return {"body": io.BytesIO(json.dumps(response).encode("utf-8"))}
+
+    def _response(self, model_id: str, request: Dict) -> Dict:
+        if "text_prompts" in request:
+            return {"artifacts": [{"base64": self.image_base64}]}
+        if "taskType" in request:
+            count = request["imageGenerationConfig"].get("numberOfImages", 1)
+            return {"images": [self.image_base64] * count}
+        text = "a detailed portrait photo, soft studio lighting, 85mm lens, sharp focus"
+        if "inputText" in request:
+            return {
+                "results": [{"outputText": text, "tokenCount": 20}],
+                "inputTextTokenCount": len(request["inputText"]) // 4,
+            }
+        return {
+            "content": [{"text": text}],
+            "usage": {"input_tokens": 300, "output_tokens": 20},
+        }
+
+
+def _serve(handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeBedrockServer:
+    """
+    FakeBedrockRuntime behind the bedrock-runtime REST API
+
+    For app processes that cannot be handed a fake client, such as gunicorn
+    workers: point AWS_ENDPOINT_URL_BEDROCK_RUNTIME at base_url and boto3
+    sends InvokeModel here. Throttles are returned as HTTP 429 with the error
+    type header botocore parses into a ThrottlingException.
+    """
+
+    def __init__(self, runtime: FakeBedrockRuntime):
+        self.runtime = runtime
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeBedrockServer":
+        runtime = self.runtime
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, headers: Dict[str, str]):
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                parts = urlsplit(self.path).path.split("/")
+                # /model/{modelId}/invoke
+                if len(parts) != 4 or parts[1] != "model" or parts[3] != "invoke":
+                    return self._send(404, b"{}", {"Content-Type": "application/json"})
+                try:
+                    response = runtime.invoke_model(unquote(parts[2]), body.decode("utf-8"))
+                except ClientError as e:
+                    error = e.response["Error"]
+                    return self._send(
+                        429,
+                        json.dumps({"message": error["Message"]}).encode("utf-8"),
+                        {"Content-Type": "application/json", "x-amzn-ErrorType": error["Code"]},
+                    )
+                self._send(200, response["body"].read(), {"Content-Type": "application/json"})
+
+        self._server = _serve(Handler)
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class FakeFluxServer:
+    """
+    Local HTTP server mimicking the BFL API's submit/poll/download flow
+
+    POST /v1/flux-kontext-pro returns an id and polling_url; polling reports
+    Pending until ready_after seconds have passed, then Ready with a sample
+    URL served by the same server. GET /images/<name>.png serves sample
+    images for merge and proxy requests.
+    """
+
+    def __init__(self, ready_after: float = 1.5, moderation_rate: float = 0.0):
+        self.ready_after = ready_after
+        self.moderation_rate = moderation_rate
+        self.jpeg = sample_image(1024, 1024, "JPEG")
+        self.png = sample_image(512, 512, "PNG")
+        self.tasks: Dict[str, Dict] = {}
+        self.polls = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeFluxServer":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, payload: Dict, status: int = 200):
+                self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                if self.path != "/v1/flux-kontext-pro":
+                    return self._json({"detail": "Not found"}, 404)
+                task_id = str(uuid.uuid4())
+                fake.tasks[task_id] = {
+                    "created": time.monotonic(),
+                    "moderated": random.random() < fake.moderation_rate,
+                }
+                self._json(
+                    {"id": task_id, "polling_url": f"{fake.base_url}/v1/get_result?id={task_id}"}
+                )
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == "/v1/get_result":
+                    fake.polls += 1
+                    task_id = parse_qs(url.query).get("id", [""])[0]
+                    task = fake.tasks.get(task_id)
+                    if not task:
+                        return self._json({"status": "Task not found"})
+                    if time.monotonic() - task["created"] < fake.ready_after:
+                        return self._json({"id": task_id, "status": "Pending"})
+                    if task["moderated"]:
+                        return self._json({"id": task_id, "status": "Request Moderated"})
+                    return self._json(
+                        {
+                            "id": task_id,
+                            "status": "Ready",
+                            "result": {"sample": f"{fake.base_url}/samples/{task_id}.jpg"},
+                        }
+                    )
+                if url.path.startswith("/samples/"):
+                    return self._send(200, fake.jpeg, "image/jpeg")
+                if url.path.startswith("/images/"):
+                    return self._send(200, fake.png, "image/png")
+                self._json({"detail": "Not found"}, 404)
+
+        self._server = _serve(Handler)
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,519 @@
+"""
+Offline load test for the Flask API
+
+Boots create_app() on a local port with Bedrock replaced by FakeBedrockRuntime,
+FLUX pointed at FakeFluxServer and S3/DynamoDB served by moto, then drives a
+weighted mix of endpoints from closed-loop client threads and reports
+throughput, latency percentiles and memory use. Needs no network or AWS account.
+
+    python -m benchmarks.load_test --duration 30 --concurrency 16
+    python -m benchmarks.load_test --mix generate=1 --throttle-rate 0.1 --json out.json
+
+With --server gunicorn the app runs under gunicorn.conf.py in a separate
+process instead; S3/DynamoDB are then served by moto's standalone server and
+Bedrock by FakeBedrockServer, reached through AWS_ENDPOINT_URL overrides.
+
+    python -m benchmarks.load_test --server gunicorn --gunicorn-args "--workers 2"
+"""
+
+import argparse
+import base64
+import json
+import logging
+import os
+import random
+import resource
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_MIX = "generate=4,flux=1,merge=2,explore=2,gallery=2"
+USERS = [f"bench-user-{index}" for index in range(20)]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds first")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight list")
+    parser.add_argument("--text-latency", type=float, default=0.5)
+    parser.add_argument("--image-latency", type=float, default=1.5)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--model-concurrency", type=int, default=8)
+    parser.add_argument("--flux-ready-after", type=float, default=1.5)
+    parser.add_argument(
+        "--random-seed-ratio",
+        type=float,
+        default=0.8,
+        help="fraction of /api/generate calls with seed=random (uncacheable)",
+    )
+    parser.add_argument("--seed-generations", type=int, default=200)
+    parser.add_argument(
+        "--server",
+        choices=("inprocess", "gunicorn"),
+        default="inprocess",
+        help="serve the app from a thread in this process or from gunicorn",
+    )
+    parser.add_argument(
+        "--gunicorn-args", default="", help="extra gunicorn flags, e.g. \"--workers 2\""
+    )
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def configure_environment(flux_url: str):
+    """Environment the app reads at import time; must run before importing it"""
+    os.environ.update(
+        {
+            "FLUX_BASE_URL": f"{flux_url}/v1",
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "AWS_REGION": "us-east-1",
+            "AWS_DEFAULT_REGION": "us-east-1",
+            "DYNAMODB_TABLE_NAME": "bench-generations",
+            "S3_BUCKET_NAME": "bench-images",
+            "FLUX_API_KEY": "bench",
+            "IMAGE_CACHE_DIR": tempfile.mkdtemp(prefix="bench-image-cache-"),
+        }
+    )
+    os.environ.setdefault("TRACING_EXPORTER", "none")
+    # The load generator is one client hammering the API; measure capacity, not limits
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+
+def provision_storage(seed_generations: int, image: bytes):
+    """Create the bucket and table in moto and seed generations for gallery/explore"""
+    import boto3
+
+    from setup_aws_resources import create_dynamodb_table
+
+    bucket = os.environ["S3_BUCKET_NAME"]
+    boto3.client("s3").create_bucket(Bucket=bucket)
+    create_dynamodb_table()
+
+    table = boto3.resource("dynamodb").Table(os.environ["DYNAMODB_TABLE_NAME"])
+    s3 = boto3.client("s3")
+    now = datetime.utcnow()
+    with table.batch_writer() as batch:
+        for index in range(seed_generations):
+            generation_id = str(uuid.uuid4())
+            user_id = USERS[index % len(USERS)]
+            key = f"generations/{user_id}/{generation_id}.png"
+            s3.put_object(Bucket=bucket, Key=key, Body=image, ContentType="image/png")
+            created_at = (now - timedelta(minutes=index)).isoformat()
+            batch.put_item(
+                Item={
+                    "generation_id": generation_id,
+                    "user_id": user_id,
+                    "user_email": f"{user_id}@example.com",
+                    "prompt": "a portrait of a traveller in a neon city at night",
+                    "image_model": "titan-g1",
+                    "llm_model": "claude",
+                    "image_url": f"https://{bucket}.s3.amazonaws.com/{key}",
+                    "image_key": key,
+                    "character_data": json.dumps({"gender": "female", "age": "30s"}),
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                    "status": "completed",
+                    "is_public": "true" if index % 3 == 0 else "false",
+                }
+            )
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_healthy(base_url: str, process: subprocess.Popen, timeout: float = 60.0):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn exited with status {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"{base_url} did not become healthy within {timeout:.0f}s")
+
+
+def start_app(fake_bedrock):
+    """Import the app with the fake Bedrock client wired in and serve it on a local port"""
+    from werkzeug.serving import make_server
+
+    from influencer_api import create_app
+    from services.bedrock_service import bedrock_service
+    from services.image_generation_service import image_service
+
+    for service, client_attr, flag in (
+        (bedrock_service, "client", "_initialized"),
+        (image_service, "bedrock_client", "_bedrock_initialized"),
+    ):
+        setattr(service, client_attr, fake_bedrock)
+        setattr(service, flag, True)
+
+    app = create_app()
+    # Per-request INFO logs would dominate the run's CPU profile and output
+    for name in ("", "werkzeug"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def build_scenarios(args, flux_url: str, image: bytes) -> Dict[str, Callable]:
+    """One callable per endpoint: session, base_url -> response"""
+    data_url = "data:image/png;base64," + base64.b64encode(image).decode("utf-8")
+    prompts = [
+        "a woman hiking in the alps at sunrise",
+        "a chef plating dessert in a busy kitchen",
+        "a skateboarder mid-air over a city plaza",
+        "a portrait of an astronaut in a flower field",
+    ]
+
+    def generate(session, base_url):
+        seed = "random" if random.random() < args.random_seed_ratio else 0
+        return session.post(
+            f"{base_url}/api/generate",
+            json={
+                "prompt": random.choice(prompts),
+                "model": "titan-g1",
+                "enhance_prompt": random.random() < 0.5,
+                "seed": seed,
+            },
+        )
+
+    def flux(session, base_url):
+        return session.post(
+            f"{base_url}/api/image/flux",
+            json={"input_image": data_url, "prompt": "put the product in her hand"},
+        )
+
+    def merge(session, base_url):
+        return session.post(
+            f"{base_url}/api/merge",
+            json={
+                "left_url": f"{flux_url}/images/left.png",
+                "right_url": data_url,
+                "target_width": 512,
+                "target_height": 512,
+            },
+        )
+
+    def explore(session, base_url):
+        return session.get(f"{base_url}/api/explore", params={"limit": 50})
+
+    def gallery(session, base_url):
+        return session.get(
+            f"{base_url}/api/generations",
+            params={"limit": 20},
+            headers={"X-User-ID": random.choice(USERS)},
+        )
+
+    return {
+        "generate": generate,
+        "flux": flux,
+        "merge": merge,
+        "explore": explore,
+        "gallery": gallery,
+    }
+
+
+def parse_mix(mix: str, scenarios: Dict[str, Callable]) -> List[Tuple[str, float]]:
+    weights = []
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in scenarios:
+            raise SystemExit(f"Unknown endpoint in --mix: {name}")
+        weights.append((name, float(weight or 1)))
+    return weights
+
+
+def memory_mb(pid="self") -> float:
+    """
+    Proportional set size of a process from /proc
+
+    PSS splits pages shared between processes (e.g. by gunicorn's preload)
+    among them, so summing it over a process tree does not double count.
+    Falls back to RSS, then to our own peak RSS.
+    """
+    for path, field in ((f"/proc/{pid}/smaps_rollup", "Pss:"), (f"/proc/{pid}/status", "VmRSS:")):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(field):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            continue
+    return peak_rss_mb(resource.RUSAGE_SELF) if pid == "self" else 0.0
+
+
+def child_pids(pid: int) -> List[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def tree_memory_mb(root: int, server_depth: int) -> Tuple[float, float]:
+    """
+    Memory of a process tree split into (server, image codec workers)
+
+    Processes up to server_depth below root count as the server (gunicorn's
+    master and workers); anything deeper is a codec worker.
+    """
+    server = codec = 0.0
+    level, depth = [root], 0
+    while level:
+        mb = sum(memory_mb(pid) for pid in level)
+        if depth <= server_depth:
+            server += mb
+        else:
+            codec += mb
+        level = [child for pid in level for child in child_pids(pid)]
+        depth += 1
+    return server, codec
+
+
+def peak_rss_mb(who) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(args, base_url: str, scenarios, weights, sample_memory: Callable):
+    import requests
+
+    names = [name for name, _ in weights]
+    cum_weights = [weight for _, weight in weights]
+    results = defaultdict(list)  # endpoint -> [(latency, ok)]
+    memory_samples = []  # (server process, codec workers)
+    start = time.monotonic()
+    measure_from = start + args.warmup
+    stop_at = measure_from + args.duration
+    lock = threading.Lock()
+
+    def client():
+        session = requests.Session()
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                return
+            name = random.choices(names, cum_weights)[0]
+            began = time.perf_counter()
+            try:
+                ok = scenarios[name](session, base_url).status_code < 400
+            except requests.RequestException:
+                ok = False
+            latency = time.perf_counter() - began
+            if now >= measure_from:
+                with lock:
+                    results[name].append((latency, ok))
+
+    def record_memory():
+        while time.monotonic() < stop_at:
+            memory_samples.append(sample_memory())
+            time.sleep(0.5)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(args.concurrency)]
+    threads.append(threading.Thread(target=record_memory, daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, memory_samples
+
+
+def build_report(args, results, memory_samples, fake_bedrock, fake_flux) -> Dict:
+    endpoints = {}
+    total = 0
+    for name, samples in sorted(results.items()):
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        total += len(samples)
+        endpoints[name] = {
+            "requests": len(samples),
+            "errors": errors,
+            "rps": round(len(samples) / args.duration, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p90_ms": round(percentile(latencies, 90) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "max_ms": round((latencies[-1] if latencies else 0) * 1000, 1),
+        }
+    return {
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "duration", "concurrency", "mix", "text_latency", "image_latency",
+                "throttle_rate", "model_concurrency", "flux_ready_after",
+                "server", "gunicorn_args",
+            )
+        },
+        "total_rps": round(total / args.duration, 2),
+        "endpoints": endpoints,
+        "memory_mb": {
+            "start": round(memory_samples[0][0], 1) if memory_samples else None,
+            "peak": round(max(s for s, _ in memory_samples), 1) if memory_samples else None,
+            "end": round(memory_samples[-1][0], 1) if memory_samples else None,
+            "codec_workers_peak": (
+                round(max(c for _, c in memory_samples), 1) if memory_samples else None
+            ),
+        },
+        "fakes": {
+            "bedrock_calls": dict(fake_bedrock.calls),
+            "bedrock_throttles": fake_bedrock.throttles,
+            "flux_polls": fake_flux.polls,
+        },
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n{'endpoint':<10} {'reqs':>6} {'err':>5} {'rps':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for name, row in report["endpoints"].items():
+        print(
+            f"{name:<10} {row['requests']:>6} {row['errors']:>5} {row['rps']:>7} "
+            f"{row['p50_ms']:>7.0f}ms {row['p90_ms']:>6.0f}ms {row['p99_ms']:>6.0f}ms {row['max_ms']:>6.0f}ms"
+        )
+    memory = report["memory_mb"]
+    print(f"\ntotal rps: {report['total_rps']}")
+    print(
+        f"memory MB (PSS): start {memory['start']}, peak {memory['peak']}, end {memory['end']}, "
+        f"codec workers peak {memory['codec_workers_peak']}"
+    )
+    print(f"fakes: {report['fakes']}")
+
+
+def run_inprocess(args, fake_bedrock, fake_flux, image):
+    """Serve the app from this process with moto patching boto3 in place"""
+    from moto import mock_aws
+
+    with mock_aws():
+        provision_storage(args.seed_generations, image)
+        server, base_url = start_app(fake_bedrock)
+        scenarios = build_scenarios(args, fake_flux.base_url, image)
+        print(
+            f"Driving {base_url} with {args.concurrency} clients for "
+            f"{args.warmup:.0f}s warmup + {args.duration:.0f}s ({args.mix})"
+        )
+        try:
+            return run_load(
+                args,
+                base_url,
+                scenarios,
+                parse_mix(args.mix, scenarios),
+                lambda: tree_memory_mb(os.getpid(), server_depth=0),
+            )
+        finally:
+            server.shutdown()
+
+
+def run_gunicorn(args, fake_bedrock, fake_flux, image):
+    """Serve the app from gunicorn with AWS and Bedrock reached over local endpoints"""
+    from moto.server import ThreadedMotoServer
+
+    from benchmarks.fakes import FakeBedrockServer
+
+    # moto's server logs every request through werkzeug
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    moto_port = free_port()
+    moto = ThreadedMotoServer(ip_address="127.0.0.1", port=moto_port, verbose=False)
+    moto.start()
+    bedrock = FakeBedrockServer(fake_bedrock).start()
+    os.environ.update(
+        {
+            "AWS_ENDPOINT_URL": f"http://127.0.0.1:{moto_port}",
+            "AWS_ENDPOINT_URL_BEDROCK_RUNTIME": bedrock.base_url,
+            "PROMETHEUS_MULTIPROC_DIR": tempfile.mkdtemp(prefix="bench-metrics-"),
+        }
+    )
+    provision_storage(args.seed_generations, image)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    log_path = os.path.join(tempfile.mkdtemp(prefix="bench-gunicorn-"), "gunicorn.log")
+    command = [
+        sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+        *shlex.split(args.gunicorn_args), "application:application",
+    ]
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=log, stderr=log)
+    try:
+        wait_until_healthy(base_url, process)
+        scenarios = build_scenarios(args, fake_flux.base_url, image)
+        print(
+            f"Driving {base_url} ({' '.join(command[3:])}) with {args.concurrency} clients for "
+            f"{args.warmup:.0f}s warmup + {args.duration:.0f}s ({args.mix}); log: {log_path}"
+        )
+        return run_load(
+            args,
+            base_url,
+            scenarios,
+            parse_mix(args.mix, scenarios),
+            lambda: tree_memory_mb(process.pid, server_depth=1),
+        )
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        bedrock.stop()
+        moto.stop()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from benchmarks.fakes import FakeBedrockRuntime, FakeFluxServer, sample_image
+
+    fake_flux = FakeFluxServer(ready_after=args.flux_ready_after).start()
+    configure_environment(fake_flux.base_url)
+    image = sample_image()
+    fake_bedrock = FakeBedrockRuntime(
+        text_latency=args.text_latency,
+        image_latency=args.image_latency,
+        throttle_rate=args.throttle_rate,
+        max_concurrency=args.model_concurrency,
+    )
+
+    run = run_gunicorn if args.server == "gunicorn" else run_inprocess
+    try:
+        results, memory_samples = run(args, fake_bedrock, fake_flux, image)
+    finally:
+        fake_flux.stop()
+
+    report = build_report(args, results, memory_samples, fake_bedrock, fake_flux)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
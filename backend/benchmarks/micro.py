@@ -0,0 +1,261 @@
+"""
+Micro-benchmarks for CPU hot paths, compared against stored baselines
+
+Times the image merge and encode paths at several sizes, base64 encoding and
+data URL decoding of multi-MB images, and result-page normalization, then
+compares each median against benchmarks/baselines/micro.json. Exits non-zero
+when any case is slower than its baseline by more than --threshold.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --filter merge --rounds 20
+    python -m benchmarks.micro --update-baseline
+"""
+
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "micro.json")
+
+
+@dataclass
+class Case:
+    """A timed call; setup runs untimed before every round and its result is passed in"""
+
+    name: str
+    func: Callable[[Any], Any]
+    setup: Optional[Callable[[], Any]] = None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--filter", help="only run cases whose name contains this")
+    parser.add_argument("--rounds", type=int, default=7, help="minimum timed rounds per case")
+    parser.add_argument("--min-time", type=float, default=1.0, help="minimum seconds per case")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="fractional slowdown over baseline reported as a regression",
+    )
+    parser.add_argument("--json", help="also write this run's results to this file")
+    return parser.parse_args(argv)
+
+
+def generation_page(size: int) -> List[Dict[str, Any]]:
+    """A page of items shaped like DynamoDB returns them, before normalization"""
+    character = json.dumps(
+        {"gender": "female", "age": "30s", "style": "editorial", "traits": ["curious"] * 8}
+    )
+    return [
+        {
+            "generation_id": f"gen-{index}",
+            "user_id": f"user-{index % 50}",
+            "prompt": "a portrait of a traveller in a neon city at night, cinematic" * 3,
+            "image_model": "titan-g1",
+            "image_url": f"https://bucket.s3.amazonaws.com/generations/{index}.webp",
+            "character_data": character,
+            "created_at": "2026-01-01T00:00:00",
+            "status": "completed",
+            "is_public": "true" if index % 2 else "false",
+        }
+        for index in range(size)
+    ]
+
+
+def build_cases() -> List[Case]:
+    from benchmarks.fakes import sample_image
+    from services.image_codec import (
+        _merge_side_by_side,
+        _transcode,
+        fetch_image_bytes,
+        image_codec,
+    )
+    from services.storage_service import storage_service
+
+    cases = []
+    for size in (512, 1024, 2048):
+        png = sample_image(size, size, "PNG")
+        cases.append(
+            Case(
+                f"merge.inline_{size}",
+                lambda _, png=png, size=size: _merge_side_by_side(
+                    [png, png], size, size, "flux_input"
+                ),
+            )
+        )
+
+    png_1024 = sample_image(1024, 1024, "PNG")
+    # Includes shared-memory transfer and process hand-off on top of the encode
+    cases.append(
+        Case(
+            "merge.codec_1024",
+            lambda _: image_codec.merge_side_by_side([png_1024, png_1024], 1024, 1024),
+        )
+    )
+    for profile in ("flux_input", "gallery", "archive"):
+        cases.append(
+            Case(
+                f"encode.{profile}_1024",
+                lambda _, profile=profile: _transcode([png_1024], profile),
+            )
+        )
+
+    rng = random.Random(0)
+    for megabytes in (2, 8):
+        blob = rng.randbytes(megabytes * 1024 * 1024)
+        data_url = "data:image/png;base64," + base64.b64encode(blob).decode("utf-8")
+        cases.append(
+            Case(
+                f"base64.encode_{megabytes}mb",
+                lambda _, blob=blob: base64.b64encode(blob).decode("utf-8"),
+            )
+        )
+        cases.append(
+            Case(
+                f"base64.decode_data_url_{megabytes}mb",
+                lambda _, data_url=data_url: fetch_image_bytes(data_url),
+            )
+        )
+
+    for size in (100, 1000):
+        cases.append(
+            Case(
+                f"normalize.page_{size}",
+                lambda page: [storage_service._normalize_generation_data(item) for item in page],
+                setup=lambda size=size: generation_page(size),
+            )
+        )
+    return cases
+
+
+def measure(case: Case, rounds: int, min_time: float) -> Dict[str, float]:
+    """Time rounds after one warm-up call until both minimums are met"""
+    case.func(case.setup() if case.setup else None)
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < rounds or time.perf_counter() - started < min_time:
+        arg = case.setup() if case.setup else None
+        began = time.perf_counter()
+        case.func(arg)
+        timings.append(time.perf_counter() - began)
+        if len(timings) >= 1000:
+            break
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+        "rounds": len(timings),
+    }
+
+
+def machine_info() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: Dict, baseline: Optional[Dict], threshold: float) -> List[Dict]:
+    """One row per case with its change against the baseline median"""
+    rows = []
+    baseline_results = (baseline or {}).get("results", {})
+    for name, current in results.items():
+        previous = baseline_results.get(name)
+        row = {"name": name, "current_ms": current["median_ms"], "baseline_ms": None, "change": None}
+        if not previous:
+            row["status"] = "new"
+        else:
+            row["baseline_ms"] = previous["median_ms"]
+            row["change"] = current["median_ms"] / previous["median_ms"] - 1
+            if row["change"] > threshold:
+                row["status"] = "REGRESSION"
+            elif row["change"] < -threshold:
+                row["status"] = "faster"
+            else:
+                row["status"] = "ok"
+        rows.append(row)
+    return rows
+
+
+def print_report(rows: List[Dict]):
+    print(f"\n{'case':<30} {'baseline':>10} {'current':>10} {'change':>8}  status")
+    for row in rows:
+        baseline = f"{row['baseline_ms']:.2f}ms" if row["baseline_ms"] is not None else "-"
+        change = f"{row['change']:+.0%}" if row["change"] is not None else "-"
+        print(
+            f"{row['name']:<30} {baseline:>10} {row['current_ms']:>8.2f}ms {change:>8}  {row['status']}"
+        )
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    os.environ.setdefault("TRACING_EXPORTER", "none")
+
+    from services.image_codec import image_codec
+
+    cases = [c for c in build_cases() if not args.filter or args.filter in c.name]
+    results = {}
+    try:
+        for case in cases:
+            results[case.name] = measure(case, args.rounds, args.min_time)
+            print(f"{case.name:<30} {results[case.name]['median_ms']:>10.2f}ms")
+    finally:
+        image_codec.shutdown()
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("machine") != machine_info():
+            print(
+                f"\nWarning: baseline was recorded on {baseline.get('machine')}; "
+                "differences may reflect the machine rather than the code"
+            )
+
+    rows = compare(results, baseline, args.threshold)
+    print_report(rows)
+
+    run = {
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": machine_info(),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(dict(run, comparison=rows), f, indent=2)
+    if args.update_baseline:
+        if baseline and args.filter:
+            # Keep the cases this run skipped
+            run["results"] = dict(baseline.get("results", {}), **results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    regressions = [row["name"] for row in rows if row["status"] == "REGRESSION"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
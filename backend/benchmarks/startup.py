@@ -0,0 +1,67 @@
+"""
+Cold-start timing for the Flask app
+
+Runs each measurement in a fresh interpreter and reports the median time to
+import influencer_api, build the app and serve the first /health request,
+plus which heavy modules were loaded by then.
+
+    python -m benchmarks.startup --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("boto3", "botocore.client", "requests", "PIL.Image")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import influencer_api
+imported = time.perf_counter()
+app = influencer_api.create_app()
+created = time.perf_counter()
+app.test_client().get("/health")
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_health_ms": (served - created) * 1000,
+    "total_ms": (served - started) * 1000,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def probe() -> dict:
+    env = dict(os.environ, TRACING_EXPORTER="none")
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    probe()  # populate the bytecode cache so every run compares like with like
+    runs = [probe() for _ in range(args.runs)]
+    for key in ("import_ms", "create_app_ms", "first_health_ms", "total_ms"):
+        print(f"{key:<16} {statistics.median(run[key] for run in runs):>8.1f}")
+    print(f"heavy modules loaded by first /health: {runs[-1]['loaded'] or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
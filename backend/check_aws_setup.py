@@ -77,7 +77,7 @@ def check_dynamodb_permissions():
                     # Try to list tables to test permissions
                     dynamodb.list_tables()
                     print("✅ DynamoDB permissions appear to be working")
-                    print("   Table will be created automatically on first use")
+                    print("   Run setup_aws_resources.py to create it")
                     return True
                 except ClientError as perm_error:
                     print(f"❌ DynamoDB permission error: {perm_error}")
@@ -0,0 +1,95 @@
+"""
+Gunicorn configuration, loaded automatically from the working directory
+
+Requests spend most of their time waiting on Bedrock, FLUX polling, S3 and
+DynamoDB, and image work runs in the codec's process pool, so each worker is
+a gthread worker serving many requests from one process. gevent is not used:
+its monkey-patching does not mix with the codec's process pool or the
+thread-based schedulers. Every setting can be overridden through the
+GUNICORN_* environment variables below or on the command line.
+"""
+
+import os
+import shutil
+import tempfile
+
+_cpus = os.cpu_count() or 1
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+# One process per core (at least two, so a crashed or recycled worker never
+# leaves the instance without one); threads cover the I/O wait
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(max(2, _cpus), 8))))
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+# The heartbeat comes from the worker's main thread, so long FLUX jobs and SSE
+# streams on request threads do not count against it
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Longer than the 60s idle timeout of ALB / App Runner, so the balancer closes
+# idle connections first and never reuses one gunicorn has just dropped
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+
+# Recycle workers to bound memory growth; jitter keeps them from restarting together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# Import the app once in the master so workers share its pages copy-on-write.
+# Nothing opens connections or starts threads at import time; clients are
+# built per worker in post_worker_init
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Heartbeat files on tmpfs, so a slow container disk cannot stall workers
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+# Split the cores between the workers' image codec pools instead of giving
+# each worker a pool as large as the machine
+os.environ.setdefault("IMAGE_CODEC_WORKERS", str(max(1, _cpus // workers)))
+
+# Each worker writes its metrics to this directory and /metrics aggregates them.
+# It must be set before the workers import prometheus_client.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "clonefluencer-metrics")
+)
+
+
+def on_starting(server):
+    """Start with an empty metrics directory so counters from a previous run are dropped"""
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    """Import the modules the app defers, once, in the master before it forks"""
+    if preload_app:
+        from services.warmup import import_deferred_modules
+
+        import_deferred_modules()
+
+    from services.rate_limiter import rate_limiter
+
+    if rate_limiter.per_process and server.cfg.workers > 1:
+        server.log.warning(
+            f"Rate limits are kept in memory per worker, so each is effectively "
+            f"{server.cfg.workers}x the configured value; set RATE_LIMIT_REDIS_URL "
+            f"to share them across workers"
+        )
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    """Build clients and import deferred modules before the worker accepts requests"""
+    if os.getenv("WARMUP_ON_START", "true").lower() != "true":
+        return
+    from services.warmup import warm_up
+
+    warm_up()
@@ -12,12 +12,10 @@ Features:
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import logging
 import os
-import requests
 import base64
-import io
-from PIL import Image
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -31,6 +29,12 @@ from routes.image_routes import image_bp
 from routes.health_routes import health_bp
 from routes.model_routes import model_bp
 from routes.storage_routes import storage_bp
+from routes.job_routes import job_bp
+from routes.metrics_routes import metrics_bp, register_request_metrics
+from routes.profiling_routes import profiling_bp, register_request_profiling
+from services.tracing import configure_tracing, instrument_app
+from services.image_codec import CodecBusyError, fetch_image_bytes, image_codec
+from services.image_encoding import get_profile as get_encoding_profile
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -41,6 +45,14 @@ def create_app():
     """Create and configure the Flask application"""
     app = Flask(__name__)
 
+    # Number of proxies in front of the app (e.g. 1 behind App Runner or Render)
+    # whose X-Forwarded-For and X-Forwarded-Proto entries are trusted
+    trusted_proxy_hops = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+    if trusted_proxy_hops:
+        app.wsgi_app = ProxyFix(
+            app.wsgi_app, x_for=trusted_proxy_hops, x_proto=trusted_proxy_hops
+        )
+
     # Define allowed origins for CORS
     allowed_origins = [
         "https://main.dqu54vqh53v5a.amplifyapp.com",  # Your Amplify frontend
@@ -50,17 +62,27 @@ def create_app():
     # Enable CORS with specific origins
     CORS(app, origins=allowed_origins, supports_credentials=True)
 
+    configure_tracing()
+    instrument_app(app)
+    register_request_metrics(app)
+    register_request_profiling(app)
+
     # Register blueprints
     app.register_blueprint(health_bp)
+    app.register_blueprint(metrics_bp)
     app.register_blueprint(prompt_bp, url_prefix="/api")
     app.register_blueprint(image_bp, url_prefix="/api")
     app.register_blueprint(model_bp, url_prefix="/api")
+    app.register_blueprint(job_bp, url_prefix="/api")
+    app.register_blueprint(profiling_bp, url_prefix="/api/admin")
     app.register_blueprint(storage_bp)
 
     # Simple image merge endpoint
     @app.route("/api/image/merge", methods=["POST"])
     def merge_images():
         """Server-side image merging to avoid CORS issues"""
+        import requests
+
         try:
             data = request.get_json()
 
@@ -69,8 +91,11 @@ def create_app():
 
             left_url = data.get("left_url")
             right_url = data.get("right_url")
-            target_width = data.get("target_width", 512)
-            target_height = data.get("target_height", 512)
+            target_width, target_height = image_codec.check_merge_size(
+                data.get("target_width", 512), data.get("target_height", 512)
+            )
+            # Merged images are normally uploaded to FLUX, so default to its fast JPEG profile
+            output_profile = get_encoding_profile(data.get("output_profile", "flux_input"))
 
             if not left_url or not right_url:
                 return (
@@ -78,51 +103,25 @@ def create_app():
                     400,
                 )
 
-            # Fetch both images
-            def fetch_image(url):
-                if url.startswith("data:"):
-                    # Handle data URLs
-                    header, data = url.split(",", 1)
-                    image_data = base64.b64decode(data)
-                    return Image.open(io.BytesIO(image_data))
-                else:
-                    # Fetch external URLs
-                    response = requests.get(url, timeout=30)
-                    response.raise_for_status()
-                    return Image.open(io.BytesIO(response.content))
-
-            left_img = fetch_image(left_url)
-            right_img = fetch_image(right_url)
-
-            # Resize images to target size
-            left_img = left_img.resize(
-                (target_width, target_height), Image.Resampling.LANCZOS
-            )
-            right_img = right_img.resize(
-                (target_width, target_height), Image.Resampling.LANCZOS
-            )
+            # Fetch both images (network I/O stays on the request thread)
+            left_bytes = fetch_image_bytes(left_url)
+            right_bytes = fetch_image_bytes(right_url)
 
-            # Create merged image
+            # Decode, resize, merge and encode in the codec process pool
             merged_width = target_width * 2
             merged_height = target_height
-            merged_img = Image.new("RGB", (merged_width, merged_height))
-
-            # Paste images side by side
-            merged_img.paste(left_img, (0, 0))
-            merged_img.paste(right_img, (target_width, 0))
-
-            # Convert to base64
-            buffer = io.BytesIO()
-            merged_img.save(buffer, format="PNG")
-            buffer.seek(0)
+            merged = image_codec.merge_side_by_side(
+                [left_bytes, right_bytes], target_width, target_height, output_profile.id
+            )
 
-            image_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-            data_url = f"data:image/png;base64,{image_base64}"
+            image_base64 = base64.b64encode(merged).decode("utf-8")
+            data_url = f"data:{output_profile.content_type};base64,{image_base64}"
 
             return jsonify(
                 {
                     "success": True,
                     "merged_image": data_url,
+                    "content_type": output_profile.content_type,
                     "width": merged_width,
                     "height": merged_height,
                 }
@@ -131,6 +130,12 @@ def create_app():
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching image for merge: {e}")
             return jsonify({"error": f"Failed to fetch image: {str(e)}"}), 500
+        except ValueError as e:
+            logger.error(f"Validation error in merge_images: {e}")
+            return jsonify({"error": str(e)}), 400
+        except CodecBusyError as e:
+            logger.error(f"Error in merge_images: {e}")
+            return jsonify({"error": str(e)}), 503
         except Exception as e:
             logger.error(f"Error in merge_images: {e}")
             return jsonify({"error": str(e)}), 500
@@ -7,6 +7,8 @@ health_bp = Blueprint("health", __name__)
 @health_bp.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
+    from services.image_generation_service import image_service
+
     return jsonify(
         {
             "status": "healthy",
@@ -14,6 +16,7 @@ def health_check():
             "env_vars_present": bool(
                 os.getenv("AWS_ACCESS_KEY_ID") and os.getenv("AWS_SECRET_ACCESS_KEY")
             ),
+            "image_models": image_service.get_breaker_states(),
         }
     )
 
@@ -40,6 +43,24 @@ def debug_env():
     )
 
 
+@health_bp.route("/debug/bedrock", methods=["GET"])
+def debug_bedrock():
+    """Report Bedrock token usage, scheduler state per model and the generation queue"""
+    from services.bedrock_service import bedrock_service
+    from services.bedrock_scheduler import bedrock_scheduler
+    from services.generation_scheduler import generation_scheduler
+
+    return jsonify(
+        {
+            "claude_model_id": bedrock_service.claude_model_id,
+            "prompt_caching": bedrock_service.supports_prompt_caching(),
+            "usage": bedrock_service.get_usage_stats(),
+            "scheduler": bedrock_scheduler.stats(),
+            "generation_queue": generation_scheduler.stats(),
+        }
+    )
+
+
 @health_bp.route("/debug/storage", methods=["GET"])
 def debug_storage():
     """Debug endpoint to test storage service initialization"""
@@ -1,12 +1,27 @@
 from flask import Blueprint, request, jsonify, send_file
-import requests
 import base64
-import io
-from PIL import Image
 import logging
 import os
 import asyncio
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Optional, Tuple
 from services.image_generation_service import ImageGenerationService
+from services.image_codec import CodecBusyError, fetch_image_bytes, image_codec
+from services.image_encoding import get_profile as get_encoding_profile
+from services.image_providers import get_provider
+from services.prompt_fitter import fit_prompt, prompt_limit
+from services.circuit_breaker import CircuitOpenError
+from services.bedrock_scheduler import PRIORITY_BATCH
+from services.generation_scheduler import (
+    GenerationQueueFullError,
+    generation_cost,
+    generation_scheduler,
+)
+from services.job_registry import JOB_FAILED, JOB_READY, job_registry
+from routes.rate_limit import rate_limited, request_user_key
+from routes.sse import sse_event, sse_response
+from services.tracing import TracedThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 image_bp = Blueprint("image", __name__)
@@ -19,8 +34,80 @@ flux_api_key = os.getenv("FLUX_API_KEY")
 if flux_api_key:
     image_service.set_flux_api_key(flux_api_key)
 
+# Runs the speculative draft, enhancement and final generation of streamed requests
+pipeline_executor = TracedThreadPoolExecutor(
+    max_workers=int(os.getenv("GENERATE_PIPELINE_WORKERS", "16")),
+    thread_name_prefix="generate-pipeline",
+)
+
+# Runs batch items, each already holding a fair-share generation slot, so
+# batches never occupy pipeline threads that streamed requests are waiting for
+batch_executor = TracedThreadPoolExecutor(
+    max_workers=generation_scheduler.max_concurrency,
+    thread_name_prefix="generate-batch",
+)
+
+# Upper bound on prompts accepted by a single /generate/batch request
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "20"))
+
+
+def _batch_cost() -> float:
+    """Charge a batch one generation token per prompt"""
+    prompts = (request.get_json(silent=True) or {}).get("prompts")
+    return min(len(prompts), BATCH_MAX_PROMPTS) if isinstance(prompts, list) and prompts else 1
+
+
+def _busy_response(error: Exception):
+    """503 for a generation the fair-share queue refused or could not serve in time"""
+    response = jsonify({"error": str(error)})
+    response.headers["Retry-After"] = "5"
+    return response, 503
+
+
+def _validate_size(width, height, image_model: str) -> Tuple[int, int]:
+    """Check a request's width and height are positive ints the model supports"""
+    for name, value in (("width", width), ("height", height)):
+        if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+            raise ValueError(f"{name} must be a positive integer")
+    if not get_provider(image_model).supports_size(width, height):
+        raise ValueError(f"Unsupported size {width}x{height} for {image_model}")
+    return width, height
+
+
+def _validate_seed(seed, image_model: str, allow_random: bool = True) -> Optional[int]:
+    """
+    Check a request's seed against the model's range
+
+    Returns None for "random" (when allowed). Raises ValueError otherwise, so
+    values Bedrock would reject never reach the circuit breaker or the cache.
+    """
+    if allow_random and seed == "random":
+        return None
+    # bool is an int subclass, but true/false are not seeds
+    if isinstance(seed, bool) or not isinstance(seed, int):
+        raise ValueError(
+            "seed must be an integer or \"random\"" if allow_random else "seed must be an integer"
+        )
+    max_seed = get_provider(image_model).max_seed
+    if not 0 <= seed <= max_seed:
+        raise ValueError(f"seed must be between 0 and {max_seed} for {image_model}")
+    return seed
+
+
+def _fit_for_model(prompt: str, image_model: str) -> str:
+    """Fit the prompt into the image model's limit, dropping low-value phrases first"""
+    max_prompt_length = prompt_limit(image_model)
+    if len(prompt) <= max_prompt_length:
+        return prompt
+    fitted = fit_prompt(prompt, max_prompt_length)
+    logging.info(
+        f"Fitted prompt from {len(prompt)} to {len(fitted)} characters for {image_model} model compatibility (limit: {max_prompt_length})"
+    )
+    return fitted
+
 
 @image_bp.route("/generate", methods=["POST", "OPTIONS"])
+@rate_limited("generate")
 def generate_image():
     """Generate an image using AWS Bedrock"""
     # Handle OPTIONS request for CORS preflight
@@ -46,6 +133,19 @@ def generate_image():
         if not prompt:
             return jsonify({"error": "Prompt is required"}), 400
 
+        width, height = _validate_size(
+            data.get("width", 1024), data.get("height", 1024), image_model
+        )
+        # Preview mode renders at the model's smallest size for fast iteration
+        preview = data.get("preview", False)
+
+        # A fixed seed (default 0) is deterministic and cacheable; "random" bypasses the cache.
+        # Previews default to a random seed so each iteration explores a new variation.
+        seed = _validate_seed(data.get("seed", "random" if preview else 0), image_model)
+
+        if preview:
+            width, height = get_provider(image_model).preview_dimensions(width, height)
+
         # Import services here to avoid circular imports
         from services.bedrock_service import bedrock_service
         from services.prompt_service import prompt_service
@@ -69,27 +169,14 @@ def generate_image():
             else:
                 logging.warning("Failed to enhance prompt, using original")
 
-        # Set prompt length limits based on the specific image model
-        model_prompt_limits = {
-            "titan-g1": 512,  # Amazon Titan Image Generator G1
-            "titan-g2": 512,  # Amazon Titan Image Generator G1 v2
-            "nova-canvas": 1000,  # Nova Canvas (more generous limit)
-            "sdxl": 1000,  # SDXL 1.0 (more generous limit)
-        }
+        final_prompt = _fit_for_model(final_prompt, image_model)
 
-        max_prompt_length = model_prompt_limits.get(
-            image_model, 512
-        )  # Default to 512 for safety
-
-        if len(final_prompt) > max_prompt_length:
-            # Truncate at word boundary to avoid cutting words in half
-            final_prompt = final_prompt[:max_prompt_length].rsplit(" ", 1)[0]
-            logging.info(
-                f"Truncated prompt to {len(final_prompt)} characters for {image_model} model compatibility (limit: {max_prompt_length})"
-            )
-
-        # Generate image
-        image_data = image_service.generate_image(final_prompt, image_model)
+        # Generate image (may be served by a fallback model if routing is enabled)
+        generation = image_service.generate_image_routed(
+            final_prompt, image_model, width, height, seed=seed, user=request_user_key()
+        )
+        image_data = generation["image"]
+        generated_model = generation["model"]
 
         if not image_data:
             return jsonify({"error": "Failed to generate image"}), 500
@@ -104,7 +191,7 @@ def generate_image():
                     prompt=prompt,
                     enhanced_prompt=enhanced_prompt,
                     image_data=image_data,
-                    image_model=image_model,
+                    image_model=generated_model,
                     llm_model=llm_model,
                     character_data=character_features,
                 )
@@ -122,14 +209,352 @@ def generate_image():
                 "enhanced_prompt": enhanced_prompt,  # The enhanced version (if any)
                 "was_enhanced": enhance_prompt and enhanced_prompt is not None,
                 "generation_id": generation_id,
+                "model": generated_model,
+                "fallback_used": generated_model != image_model,
+                "seed": generation["seed"],
+                "cached": generation["cached"],
+                "width": width,
+                "height": height,
+                "preview": preview,
             }
         )
 
+    except ValueError as e:
+        logging.error(f"Validation error in generate_image: {e}")
+        return jsonify({"error": str(e)}), 400
+    except CircuitOpenError as e:
+        logging.error(f"Error in generate_image: {e}")
+        return jsonify({"error": str(e)}), 503
+    except GenerationQueueFullError as e:
+        logging.warning(f"Generation not admitted in generate_image: {e}")
+        return _busy_response(e)
     except Exception as e:
         logging.error(f"Error in generate_image: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@image_bp.route("/generate/finalize", methods=["POST", "OPTIONS"])
+@rate_limited("generate")
+def finalize_image():
+    """
+    Render a chosen preview at full resolution
+
+    Reuses the exact prompt and seed returned by a preview generation, so the
+    final image matches the preview without another enhancement pass.
+    """
+    # Handle OPTIONS request for CORS preflight
+    if request.method == "OPTIONS":
+        return "", 200
+
+    try:
+        data = request.get_json()
+
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+
+        prompt = data.get("prompt")
+        image_model = data.get("model", "titan-g1")
+        seed = data.get("seed")
+        if not prompt or seed is None:
+            return jsonify({"error": "prompt and the preview's seed are required"}), 400
+        width, height = _validate_size(
+            data.get("width", 1024), data.get("height", 1024), image_model
+        )
+        seed = _validate_seed(seed, image_model, allow_random=False)
+
+        from services.image_generation_service import image_service
+
+        # Routing to a fallback model would not reproduce the preview
+        generation = image_service.generate_image_routed(
+            _fit_for_model(prompt, image_model),
+            image_model,
+            width,
+            height,
+            allow_fallback=False,
+            seed=seed,
+            user=request_user_key(),
+        )
+
+        return jsonify(
+            {
+                "success": True,
+                "image": generation["image"],
+                "prompt": prompt,
+                "model": generation["model"],
+                "seed": generation["seed"],
+                "cached": generation["cached"],
+                "width": width,
+                "height": height,
+                "preview": False,
+            }
+        )
+
+    except ValueError as e:
+        logging.error(f"Validation error in finalize_image: {e}")
+        return jsonify({"error": str(e)}), 400
+    except CircuitOpenError as e:
+        logging.error(f"Error in finalize_image: {e}")
+        return jsonify({"error": str(e)}), 503
+    except GenerationQueueFullError as e:
+        logging.warning(f"Generation not admitted in finalize_image: {e}")
+        return _busy_response(e)
+    except Exception as e:
+        logging.error(f"Error in finalize_image: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@image_bp.route("/generate/stream", methods=["POST", "OPTIONS"])
+@rate_limited("generate")
+def generate_image_stream():
+    """
+    Generate an image with speculative pipelining over Server-Sent Events
+
+    When enhancement is requested and the model allows it, a draft of the raw
+    prompt is generated while the LLM enhances the prompt. The client receives
+    a "draft" event as soon as it is ready and a "final" event with the
+    enhanced image.
+    """
+    # Handle OPTIONS request for CORS preflight
+    if request.method == "OPTIONS":
+        return "", 200
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    prompt = data.get("prompt")
+    image_model = data.get("model", "titan-g1")
+    llm_model = data.get("llmModel", "claude")
+    enhance_prompt = data.get("enhance_prompt", False)
+
+    if not prompt:
+        return jsonify({"error": "Prompt is required"}), 400
+
+    try:
+        seed = _validate_seed(data.get("seed", 0), image_model)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        speculative = enhance_prompt and get_provider(image_model).allow_speculative
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    from services.prompt_service import prompt_service
+    from services.image_generation_service import image_service
+
+    user = request_user_key()
+
+    def generation_payload(generation, final_prompt, enhanced_prompt):
+        return {
+            "success": True,
+            "image": generation["image"],
+            "prompt": final_prompt,
+            "original_prompt": prompt,
+            "enhanced_prompt": enhanced_prompt,
+            "was_enhanced": enhanced_prompt is not None,
+            "model": generation["model"],
+            "fallback_used": generation["model"] != image_model,
+            "seed": generation["seed"],
+            "cached": generation["cached"],
+        }
+
+    def events():
+        raw_prompt = _fit_for_model(prompt, image_model)
+        draft_future = None
+        try:
+            if speculative:
+                # Start the draft before the LLM call so both run concurrently
+                draft_future = pipeline_executor.submit(
+                    image_service.generate_image_routed,
+                    raw_prompt,
+                    image_model,
+                    seed=seed,
+                    user=user,
+                )
+                yield sse_event("status", {"stage": "enhancing", "draft": True})
+            elif enhance_prompt:
+                yield sse_event("status", {"stage": "enhancing", "draft": False})
+
+            enhanced_prompt = None
+            final_prompt = raw_prompt
+            if enhance_prompt:
+                enhance_future = pipeline_executor.submit(
+                    prompt_service.enhance_prompt, prompt, llm_model, image_model
+                )
+                pending = {enhance_future} | ({draft_future} if draft_future else set())
+                while not enhance_future.done():
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    if draft_future in done:
+                        yield _draft_event(draft_future, raw_prompt)
+                        draft_future = None
+                enhanced_prompt = enhance_future.result() or None
+                if enhanced_prompt:
+                    final_prompt = _fit_for_model(enhanced_prompt, image_model)
+                yield sse_event("prompt", {"enhanced_prompt": enhanced_prompt})
+
+            yield sse_event("status", {"stage": "generating"})
+            final_future = pipeline_executor.submit(
+                image_service.generate_image_routed,
+                final_prompt,
+                image_model,
+                seed=seed,
+                user=user,
+            )
+            if draft_future:
+                done, _ = wait({draft_future, final_future}, return_when=FIRST_COMPLETED)
+                # Only useful if the draft lands before the final image
+                if draft_future in done and final_future not in done:
+                    yield _draft_event(draft_future, raw_prompt)
+
+            generation = final_future.result()
+            yield sse_event(
+                "final", generation_payload(generation, final_prompt, enhanced_prompt)
+            )
+        except Exception as e:
+            logging.error(f"Error in generate_image_stream: {e}")
+            yield sse_event("error", {"error": str(e)})
+
+    return sse_response(events())
+
+
+def _draft_event(draft_future, raw_prompt: str) -> str:
+    """Format a finished speculative draft, reporting failures without aborting"""
+    try:
+        draft = draft_future.result()
+    except Exception as e:
+        logging.warning(f"Speculative draft generation failed: {e}")
+        return sse_event("draft_failed", {"error": str(e)})
+    return sse_event(
+        "draft",
+        {
+            "image": draft["image"],
+            "prompt": raw_prompt,
+            "model": draft["model"],
+            "seed": draft["seed"],
+            "cached": draft["cached"],
+        },
+    )
+
+
+@image_bp.route("/generate/batch", methods=["POST", "OPTIONS"])
+@rate_limited("generate", cost=_batch_cost)
+def generate_image_batch():
+    """
+    Start a batch generation job
+
+    Returns 202 with a job id; each image is pushed as a "result" event on
+    /api/jobs/<job_id>/events as soon as it is generated.
+    """
+    # Handle OPTIONS request for CORS preflight
+    if request.method == "OPTIONS":
+        return "", 200
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    prompts = data.get("prompts")
+    image_model = data.get("model", "titan-g1")
+    width = data.get("width", 1024)
+    height = data.get("height", 1024)
+
+    if not isinstance(prompts, list) or not prompts:
+        return jsonify({"error": "prompts must be a non-empty list"}), 400
+    if len(prompts) > BATCH_MAX_PROMPTS:
+        return (
+            jsonify({"error": f"A batch accepts at most {BATCH_MAX_PROMPTS} prompts"}),
+            400,
+        )
+
+    try:
+        seed = _validate_seed(data.get("seed", 0), image_model)
+        width, height = _validate_size(width, height, image_model)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    from services.image_generation_service import image_service
+
+    user = request_user_key()
+    if not generation_scheduler.has_room(user):
+        return _busy_response(
+            GenerationQueueFullError("Too many of your generations are already queued")
+        )
+    cost = generation_cost(width, height)
+
+    def run_batch(job):
+        failures = []
+        failures_lock = threading.Lock()
+
+        def item_failed(index: int, prompt: str, error: Exception):
+            logging.warning(f"Batch item {index} failed: {error}")
+            with failures_lock:
+                failures.append(index)
+            job.emit("item_failed", {"index": index, "prompt": prompt, "error": str(error)})
+
+        def run_item(index: int, prompt: str):
+            try:
+                generation = image_service.generate_image_routed(
+                    _fit_for_model(prompt, image_model),
+                    image_model,
+                    width,
+                    height,
+                    PRIORITY_BATCH,
+                    seed=seed,
+                )
+            except Exception as e:
+                item_failed(index, prompt, e)
+                return
+            finally:
+                generation_scheduler.release()
+            job.emit(
+                "result",
+                {
+                    "index": index,
+                    "image": generation["image"],
+                    "prompt": prompt,
+                    "model": generation["model"],
+                    "seed": generation["seed"],
+                    "cached": generation["cached"],
+                },
+            )
+
+        futures = []
+        for index, prompt in enumerate(prompts):
+            # Items wait for their fair share on this job thread, as long as it
+            # takes; only items holding a slot reach the executor
+            try:
+                generation_scheduler.acquire(user, cost, timeout=None)
+            except GenerationQueueFullError as e:
+                item_failed(index, prompt, e)
+                continue
+            futures.append(batch_executor.submit(run_item, index, prompt))
+        wait(futures)
+
+        failed = len(failures)
+        summary = {"completed": len(prompts) - failed, "failed": failed}
+        if failed == len(prompts):
+            job.finish(JOB_FAILED, result=summary, error="All batch items failed")
+        else:
+            # Images were already delivered as events; keep the snapshot small
+            job.finish(JOB_READY, result=summary)
+        return summary
+
+    job = job_registry.create("batch")
+    job_registry.run(job, run_batch)
+    return jsonify(_job_accepted(job.id, total=len(prompts))), 202
+
+
+def _job_accepted(job_id: str, **extra) -> dict:
+    """Body of a 202 response pointing the client at the job's status and events"""
+    return dict(
+        extra,
+        job_id=job_id,
+        status_url=f"/api/jobs/{job_id}",
+        events_url=f"/api/jobs/{job_id}/events",
+    )
+
+
 @image_bp.route("/proxy", methods=["POST", "OPTIONS"])
 def proxy_image():
     """Proxy endpoint to fetch images and return as base64, bypassing CORS"""
@@ -137,6 +562,8 @@ def proxy_image():
     if request.method == "OPTIONS":
         return "", 200
 
+    import requests
+
     try:
         data = request.get_json()
 
@@ -188,6 +615,8 @@ def merge_images():
     if request.method == "OPTIONS":
         return "", 200
 
+    import requests
+
     try:
         data = request.get_json()
 
@@ -196,57 +625,34 @@ def merge_images():
 
         left_url = data.get("left_url")
         right_url = data.get("right_url")
-        target_width = data.get("target_width", 512)
-        target_height = data.get("target_height", 512)
+        target_width, target_height = image_codec.check_merge_size(
+            data.get("target_width", 512), data.get("target_height", 512)
+        )
+        # Merged images are normally uploaded to FLUX, so default to its fast JPEG profile
+        output_profile = get_encoding_profile(data.get("output_profile", "flux_input"))
 
         if not left_url or not right_url:
             return jsonify({"error": "Both left_url and right_url are required"}), 400
 
-        # Fetch both images
-        def fetch_image(url):
-            if url.startswith("data:"):
-                # Handle data URLs
-                header, data = url.split(",", 1)
-                image_data = base64.b64decode(data)
-                return Image.open(io.BytesIO(image_data))
-            else:
-                # Fetch external URLs
-                response = requests.get(url, timeout=30)
-                response.raise_for_status()
-                return Image.open(io.BytesIO(response.content))
-
-        left_img = fetch_image(left_url)
-        right_img = fetch_image(right_url)
+        # Fetch both images (network I/O stays on the request thread)
+        left_bytes = fetch_image_bytes(left_url)
+        right_bytes = fetch_image_bytes(right_url)
 
-        # Resize images to target size
-        left_img = left_img.resize(
-            (target_width, target_height), Image.Resampling.LANCZOS
-        )
-        right_img = right_img.resize(
-            (target_width, target_height), Image.Resampling.LANCZOS
-        )
-
-        # Create merged image
+        # Decode, resize, merge and encode in the codec process pool
         merged_width = target_width * 2
         merged_height = target_height
-        merged_img = Image.new("RGB", (merged_width, merged_height))
-
-        # Paste images side by side
-        merged_img.paste(left_img, (0, 0))
-        merged_img.paste(right_img, (target_width, 0))
-
-        # Convert to base64
-        buffer = io.BytesIO()
-        merged_img.save(buffer, format="PNG")
-        buffer.seek(0)
+        merged = image_codec.merge_side_by_side(
+            [left_bytes, right_bytes], target_width, target_height, output_profile.id
+        )
 
-        image_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-        data_url = f"data:image/png;base64,{image_base64}"
+        image_base64 = base64.b64encode(merged).decode("utf-8")
+        data_url = f"data:{output_profile.content_type};base64,{image_base64}"
 
         return jsonify(
             {
                 "success": True,
                 "merged_image": data_url,
+                "content_type": output_profile.content_type,
                 "width": merged_width,
                 "height": merged_height,
             }
@@ -255,12 +661,19 @@ def merge_images():
     except requests.exceptions.RequestException as e:
         logging.error(f"Error fetching image for merge: {e}")
         return jsonify({"error": f"Failed to fetch image: {str(e)}"}), 500
+    except ValueError as e:
+        logging.error(f"Validation error in merge_images: {e}")
+        return jsonify({"error": str(e)}), 400
+    except CodecBusyError as e:
+        logging.error(f"Error in merge_images: {e}")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         logging.error(f"Error in merge_images: {e}")
         return jsonify({"error": str(e)}), 500
 
 
 @image_bp.route("/image/flux", methods=["POST", "OPTIONS"])
+@rate_limited("generate")
 def flux_edit_image():
     """Edit image using FLUX API"""
     # Handle OPTIONS request for CORS preflight
@@ -285,8 +698,13 @@ def flux_edit_image():
         # Get LLM model for optimization (default to claude)
         llm_model = data.get("llm_model", "claude")
 
+        # Skip the LLM and use the template fast path (or a cached result) if requested
+        fast_prompt = data.get("fast_prompt", False)
+
         # Optimize the prompt for Kontext using AI
-        optimized_prompt = kontext_service.optimize_kontext_prompt(prompt, llm_model)
+        optimized_prompt = kontext_service.optimize_kontext_prompt(
+            prompt, llm_model, use_llm=not fast_prompt
+        )
         logger.info(f"Original prompt: {prompt}")
         logger.info(f"Optimized Kontext prompt: {optimized_prompt}")
 
@@ -342,3 +760,72 @@ def flux_edit_image():
     except Exception as e:
         logger.error(f"Error in flux_edit_image: {e}")
         return jsonify({"error": str(e)}), 500
+
+
+@image_bp.route("/image/flux/jobs", methods=["POST", "OPTIONS"])
+@rate_limited("generate")
+def flux_edit_image_job():
+    """
+    Start a FLUX Kontext edit as a background job
+
+    Accepts the same body as /image/flux and returns 202 with a job id. The
+    optimized prompt, every FLUX polling status and the final image are pushed
+    on /api/jobs/<job_id>/events.
+    """
+    # Handle OPTIONS request for CORS preflight
+    if request.method == "OPTIONS":
+        return "", 200
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    input_image = data.get("input_image")
+    prompt = data.get("prompt")
+
+    if not input_image or not prompt:
+        return jsonify({"error": "Both input_image and prompt are required"}), 400
+
+    if not flux_api_key:
+        return (
+            jsonify(
+                {
+                    "error": "FLUX API key not configured. Please set FLUX_API_KEY environment variable."
+                }
+            ),
+            500,
+        )
+
+    if input_image.startswith("data:"):
+        input_image = input_image.split(",", 1)[1]
+
+    llm_model = data.get("llm_model", "claude")
+    fast_prompt = data.get("fast_prompt", False)
+
+    def run_flux(job):
+        from services.kontext_service import kontext_service
+
+        final_prompt = kontext_service.optimize_kontext_prompt(
+            prompt, llm_model, use_llm=not fast_prompt
+        ).strip()
+        job.emit("prompt", {"original_prompt": prompt, "optimized_prompt": final_prompt})
+
+        result = asyncio.run(
+            image_service.generate_with_flux_kontext(
+                prompt=final_prompt,
+                input_image_base64=input_image,
+                aspect_ratio=data.get("aspect_ratio", "1:1"),
+                seed=data.get("seed"),
+                safety_tolerance=data.get("safety_tolerance", 2),
+                output_format=data.get("output_format", "jpeg"),
+                job=job,
+            )
+        )
+        result["original_prompt"] = prompt
+        result["optimized_prompt"] = final_prompt
+        job.emit("result", result)
+        return result
+
+    job = job_registry.create("flux")
+    job_registry.run(job, run_flux)
+    return jsonify(_job_accepted(job.id)), 202
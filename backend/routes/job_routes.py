@@ -0,0 +1,49 @@
+from flask import Blueprint, jsonify, request
+import os
+
+from routes.sse import sse_comment, sse_event, sse_response
+from services.job_registry import job_registry
+
+job_bp = Blueprint("jobs", __name__)
+
+# Seconds between keep-alive comments while a job is idle
+JOB_STREAM_HEARTBEAT = float(os.getenv("JOB_STREAM_HEARTBEAT_SECONDS", "15"))
+
+
+@job_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Return the current state and result of a job"""
+    job = job_registry.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.snapshot())
+
+
+@job_bp.route("/jobs/<job_id>/events", methods=["GET"])
+def stream_job_events(job_id):
+    """
+    Stream a job's state transitions and partial results over Server-Sent Events
+
+    Replays the event log from the start (or after Last-Event-ID when a client
+    reconnects) and closes the stream once the job reaches a terminal state.
+    """
+    job = job_registry.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get(
+        "last_event_id", "0"
+    )
+    try:
+        after = max(0, int(last_event_id))
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID must be an integer"}), 400
+
+    def events():
+        for event in job_registry.stream(job, after, JOB_STREAM_HEARTBEAT):
+            if event is None:
+                yield sse_comment()
+            else:
+                yield sse_event(event["type"], event["data"], event["id"])
+
+    return sse_response(events())
@@ -0,0 +1,35 @@
+from flask import Blueprint, Response, g, request
+import time
+
+from services.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS, render_metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint, aggregated across gunicorn workers"""
+    payload, content_type = render_metrics()
+    return Response(payload, content_type=content_type)
+
+
+def register_request_metrics(app):
+    """Record per-route request counts and latency for every request"""
+
+    @app.before_request
+    def start_timer():
+        g.request_started_at = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started_at = g.pop("request_started_at", None)
+        if started_at is not None:
+            # The URL rule (e.g. /api/jobs/<job_id>) keeps label cardinality bounded
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(route=route, method=request.method).observe(
+                time.perf_counter() - started_at
+            )
+            HTTP_REQUESTS.labels(
+                route=route, method=request.method, status=str(response.status_code)
+            ).inc()
+        return response
@@ -1,4 +1,5 @@
 from flask import Blueprint, jsonify
+from services.image_providers import IMAGE_PROVIDERS
 
 model_bp = Blueprint("model", __name__)
 
@@ -21,26 +22,7 @@ def list_models():
                 },
             ],
             "image_models": [
-                {
-                    "id": "titan-g1",
-                    "name": "Titan Image Generator G1",
-                    "description": "Amazon's Titan Image Generator G1",
-                },
-                {
-                    "id": "titan-g2",
-                    "name": "Titan Image Generator G1 v2",
-                    "description": "Amazon's Titan Image Generator G1 v2",
-                },
-                {
-                    "id": "nova-canvas",
-                    "name": "Nova Canvas",
-                    "description": "Amazon's Nova Canvas image model",
-                },
-                {
-                    "id": "sdxl",
-                    "name": "SDXL 1.0",
-                    "description": "Stability AI's SDXL 1.0 model",
-                },
+                provider.describe() for provider in IMAGE_PROVIDERS.values()
             ],
         }
     )
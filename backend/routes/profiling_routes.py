@@ -0,0 +1,94 @@
+from flask import Blueprint, Response, g, jsonify, request
+import hmac
+import os
+import random
+
+from opentelemetry import trace
+
+from services.profiler import request_profiler
+
+profiling_bp = Blueprint("profiling", __name__)
+
+# Shared secret for the admin endpoints and the on-demand profiling header;
+# both are disabled while it is unset
+ADMIN_TOKEN_ENV = "PROFILE_ADMIN_TOKEN"
+PROFILE_HEADER = "X-Profile-Request"
+
+
+def _token_matches(value) -> bool:
+    token = os.getenv(ADMIN_TOKEN_ENV)
+    return bool(token and value) and hmac.compare_digest(value, token)
+
+
+def _request_model():
+    """Model named in the request body or query, if any"""
+    if request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict) and body.get("model"):
+            return str(body["model"])
+    return request.args.get("model")
+
+
+@profiling_bp.route("/profiles", methods=["GET"])
+def list_profiles():
+    """List recorded request profiles, newest first"""
+    if not _token_matches(request.headers.get("X-Admin-Token")):
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(
+        {"profiles": request_profiler.list_profiles(), "profiler": request_profiler.stats()}
+    )
+
+
+@profiling_bp.route("/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    """Collapsed stacks for one profile, ready for flamegraph.pl or speedscope"""
+    if not _token_matches(request.headers.get("X-Admin-Token")):
+        return jsonify({"error": "Not found"}), 404
+    collapsed = request_profiler.get_collapsed(profile_id)
+    if collapsed is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return Response(collapsed, content_type="text/plain; charset=utf-8")
+
+
+def register_request_profiling(app):
+    """Profile requests sent with the admin token header or picked by PROFILE_SAMPLE_RATE"""
+
+    @app.before_request
+    def start_profile():
+        requested = PROFILE_HEADER in request.headers and _token_matches(
+            request.headers.get(PROFILE_HEADER)
+        )
+        if not requested and not (
+            request_profiler.sample_rate and random.random() < request_profiler.sample_rate
+        ):
+            return
+        span_context = trace.get_current_span().get_span_context()
+        g.profile = request_profiler.start(
+            {
+                "method": request.method,
+                "path": request.path,
+                "trigger": "header" if requested else "sampled",
+                "trace_id": (
+                    format(span_context.trace_id, "032x") if span_context.is_valid else None
+                ),
+            }
+        )
+
+    @app.after_request
+    def expose_profile_id(response):
+        profile = g.get("profile")
+        if profile is not None:
+            profile.tags["status"] = response.status_code
+            response.headers["X-Profile-Id"] = profile.id
+        return response
+
+    @app.teardown_request
+    def stop_profile(exc):
+        profile = g.pop("profile", None)
+        if profile is not None:
+            request_profiler.stop(
+                profile,
+                route=request.url_rule.rule if request.url_rule else "unmatched",
+                model=_request_model(),
+                error=type(exc).__name__ if exc else None,
+            )
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 import logging
 from services.prompt_service import prompt_service
+from routes.rate_limit import rate_limited
 
 logger = logging.getLogger(__name__)
 
@@ -10,6 +11,7 @@ prompt_bp = Blueprint("prompt", __name__)
 
 
 @prompt_bp.route("/enhance-prompt", methods=["POST", "OPTIONS"])
+@rate_limited("prompt")
 def enhance_prompt():
     """Enhance user prompt with AI suggestions"""
     # Handle OPTIONS request for CORS preflight
@@ -36,6 +38,7 @@ def enhance_prompt():
 
 
 @prompt_bp.route("/optimize-kontext-prompt", methods=["POST", "OPTIONS"])
+@rate_limited("prompt")
 def optimize_kontext_prompt():
     """Optimize user prompt specifically for Flux Kontext"""
     # Handle OPTIONS request for CORS preflight
@@ -64,6 +67,7 @@ def optimize_kontext_prompt():
 
 
 @prompt_bp.route("/character-prompt", methods=["POST", "OPTIONS"])
+@rate_limited("prompt")
 def character_prompt():
     """Generate prompt based on character builder selections"""
     # Handle OPTIONS request for CORS preflight
@@ -75,9 +79,12 @@ def character_prompt():
         character_features = data.get("character_features", {})
         base_prompt = data.get("base_prompt", "")
         llm_model = data.get("llm_model", "claude")
+        image_model = data.get("image_model", "titan-g1")
+        # Compiled locally by default; LLM polish only when explicitly requested
+        refine = data.get("refine", False)
 
         generated_prompt = prompt_service.generate_character_prompt(
-            character_features, base_prompt, llm_model
+            character_features, base_prompt, llm_model, image_model, refine
         )
 
         return jsonify(
@@ -85,6 +92,7 @@ def character_prompt():
                 "character_features": character_features,
                 "base_prompt": base_prompt,
                 "generated_prompt": generated_prompt.strip(),
+                "refined": bool(refine),
             }
         )
 
@@ -94,6 +102,7 @@ def character_prompt():
 
 
 @prompt_bp.route("/surprise-prompt", methods=["POST", "OPTIONS"])
+@rate_limited("prompt")
 def surprise_prompt():
     """Generate a random surprise prompt for inspiration"""
     # Handle OPTIONS request for CORS preflight
@@ -0,0 +1,56 @@
+from functools import wraps
+from typing import Callable, Optional
+
+from flask import jsonify, request
+
+from services.rate_limiter import rate_limiter
+
+
+def request_user_key() -> str:
+    """
+    Bucket key for the caller: the X-User-ID header, else the client address
+
+    remote_addr is the peer address, or the address the trusted proxies
+    report when TRUSTED_PROXY_HOPS is set, so a client cannot pick a fresh
+    bucket per request by forging X-Forwarded-For. X-User-ID is not
+    authenticated, so rate_limited also charges the client address.
+    """
+    user_id = request.headers.get("X-User-ID")
+    if user_id:
+        return f"user:{user_id}"
+    return f"ip:{request.remote_addr}"
+
+
+def rate_limited(group: str, cost: Optional[Callable[[], float]] = None):
+    """
+    Reject requests over the group's per-user, per-address or global limit with 429
+
+    cost, if given, is called within the request to price it in tokens (for
+    example one per prompt of a batch); it defaults to one. CORS preflights
+    are never limited.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method == "OPTIONS":
+                return view(*args, **kwargs)
+            decision = rate_limiter.check(
+                group, request_user_key(), cost() if cost else 1.0, address=request.remote_addr
+            )
+            if not decision.allowed:
+                retry_after = max(1, int(decision.retry_after))
+                response = jsonify(
+                    {
+                        "error": "Too many requests, please retry later",
+                        "retry_after": retry_after,
+                        "scope": decision.scope,
+                    }
+                )
+                response.headers["Retry-After"] = str(retry_after)
+                return response, 429
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,26 @@
+import json
+from typing import Any, Dict, Iterable, Optional
+
+from flask import Response, stream_with_context
+
+
+def sse_event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """Format a Server-Sent Events message; an id lets clients resume via Last-Event-ID"""
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    if event_id is not None:
+        message = f"id: {event_id}\n" + message
+    return message
+
+
+def sse_comment(text: str = "keep-alive") -> str:
+    """Format an SSE comment, used as a heartbeat to keep idle connections open"""
+    return f": {text}\n\n"
+
+
+def sse_response(events: Iterable[str]) -> Response:
+    """Stream pre-formatted SSE messages without proxy buffering"""
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
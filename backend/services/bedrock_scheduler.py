@@ -0,0 +1,255 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+from .image_providers import IMAGE_PROVIDERS
+from .metrics import (
+    BEDROCK_CALLS,
+    BEDROCK_IN_FLIGHT,
+    BEDROCK_QUEUE_DEPTH,
+    BEDROCK_QUEUE_SECONDS,
+    BEDROCK_SECONDS,
+)
+from .tracing import set_attributes, traced
+
+logger = logging.getLogger(__name__)
+
+# Lower values are served first when requests queue for a model
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "ModelNotReadyException",
+}
+
+# Server-side failures worth retrying; unlike throttles they do not shrink the limit
+TRANSIENT_ERROR_CODES = {
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "ModelTimeoutException",
+}
+TRANSIENT_CONNECTION_ERRORS = (
+    EndpointConnectionError,
+    ConnectTimeoutError,
+    ConnectionClosedError,
+    ReadTimeoutError,
+)
+
+# Default concurrent-request ceilings for text models; image models declare
+# theirs in the provider registry
+DEFAULT_MODEL_CONCURRENCY = {
+    "anthropic.claude-3-sonnet-20240229-v1:0": 8,
+    "amazon.titan-text-express-v1": 8,
+}
+DEFAULT_CONCURRENCY = 4
+
+
+class SchedulerQueueFullError(Exception):
+    """Raised when too many requests are already waiting for a model"""
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter with a priority wait queue for a single model
+
+    The limit grows by roughly one slot per window of successful calls and is
+    cut multiplicatively on every throttle, never exceeding the quota ceiling.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        max_limit: int,
+        min_limit: int = 1,
+        decrease_factor: float = 0.5,
+        max_queue: int = 100,
+    ):
+        self.model_id = model_id
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease_factor = decrease_factor
+        self.max_queue = max_queue
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.throttles = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE, timeout: float = 30.0):
+        """Block until a slot is free and this request is at the head of the queue"""
+        with self._cond:
+            if len(self._waiters) >= self.max_queue:
+                raise SchedulerQueueFullError(
+                    f"Too many queued requests for {self.model_id}"
+                )
+
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+            BEDROCK_QUEUE_DEPTH.labels(model_id=self.model_id).inc()
+            deadline = time.monotonic() + timeout
+
+            while self._waiters[0] != ticket or self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                    BEDROCK_QUEUE_DEPTH.labels(model_id=self.model_id).dec()
+                    self._cond.notify_all()
+                    raise TimeoutError(
+                        f"Timed out waiting for a {self.model_id} slot"
+                    )
+                self._cond.wait(remaining)
+
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            BEDROCK_QUEUE_DEPTH.labels(model_id=self.model_id).dec()
+            BEDROCK_IN_FLIGHT.labels(model_id=self.model_id).inc()
+            # The next waiter may also fit under the limit
+            self._cond.notify_all()
+
+    def release(self, throttled: bool = False, succeeded: bool = True):
+        """Free a slot and adapt the limit to the call's outcome"""
+        with self._cond:
+            self.in_flight -= 1
+            BEDROCK_IN_FLIGHT.labels(model_id=self.model_id).dec()
+            if throttled:
+                self.throttles += 1
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            elif succeeded:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current limit, in-flight count and queue depth"""
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "max_limit": self.max_limit,
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "throttles": self.throttles,
+            }
+
+
+class BedrockScheduler:
+    """Per-model adaptive concurrency and throttle retries for invoke_model calls"""
+
+    def __init__(self):
+        self.quotas = dict(DEFAULT_MODEL_CONCURRENCY)
+        self.quotas.update(
+            {p.model_id: p.max_concurrency for p in IMAGE_PROVIDERS.values()}
+        )
+        overrides = os.getenv("BEDROCK_MODEL_CONCURRENCY")
+        if overrides:
+            try:
+                self.quotas.update(
+                    {model: int(limit) for model, limit in json.loads(overrides).items()}
+                )
+            except (ValueError, AttributeError) as e:
+                logger.error(f"Invalid BEDROCK_MODEL_CONCURRENCY: {e}")
+
+        self.max_retries = int(os.getenv("BEDROCK_MAX_RETRIES", "4"))
+        self.base_delay = float(os.getenv("BEDROCK_RETRY_BASE_DELAY", "0.25"))
+        self.max_delay = float(os.getenv("BEDROCK_RETRY_MAX_DELAY", "8"))
+        self.queue_timeout = float(os.getenv("BEDROCK_QUEUE_TIMEOUT", "30"))
+        self.max_queue = int(os.getenv("BEDROCK_MAX_QUEUE", "100"))
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model_id: str) -> AdaptiveLimiter:
+        """Return the limiter for a model, creating it on first use"""
+        with self._lock:
+            if model_id not in self._limiters:
+                self._limiters[model_id] = AdaptiveLimiter(
+                    model_id,
+                    self.quotas.get(model_id, DEFAULT_CONCURRENCY),
+                    max_queue=self.max_queue,
+                )
+            return self._limiters[model_id]
+
+    @traced("bedrock_scheduler.invoke_model")
+    def invoke_model(
+        self,
+        client,
+        model_id: str,
+        body: str,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Call client.invoke_model under the model's limiter, retrying recoverable errors"""
+        limiter = self.limiter(model_id)
+        timeout = self.queue_timeout if timeout is None else timeout
+
+        for attempt in range(self.max_retries + 1):
+            queued_at = time.perf_counter()
+            limiter.acquire(priority, timeout)
+            started_at = time.perf_counter()
+            BEDROCK_QUEUE_SECONDS.labels(model_id=model_id).observe(started_at - queued_at)
+            set_attributes(
+                **{
+                    "bedrock.model_id": model_id,
+                    "bedrock.priority": priority,
+                    "bedrock.attempts": attempt + 1,
+                    "bedrock.queue_wait_ms": round((started_at - queued_at) * 1000, 1),
+                    "request.size": len(body),
+                }
+            )
+            throttled = False
+            succeeded = False
+            try:
+                response = client.invoke_model(modelId=model_id, body=body)
+                succeeded = True
+                return response
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                throttled = code in THROTTLING_ERROR_CODES
+                retryable = throttled or code in TRANSIENT_ERROR_CODES
+                if not retryable or attempt == self.max_retries:
+                    raise
+                reason = code
+            except TRANSIENT_CONNECTION_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                reason = type(e).__name__
+            finally:
+                limiter.release(throttled=throttled, succeeded=succeeded)
+                BEDROCK_SECONDS.labels(model_id=model_id).observe(
+                    time.perf_counter() - started_at
+                )
+                outcome = "success" if succeeded else "throttled" if throttled else "error"
+                BEDROCK_CALLS.labels(model_id=model_id, outcome=outcome).inc()
+
+            # Full jitter exponential backoff before retrying the failed call
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+            logger.warning(
+                f"Bedrock {reason} for {model_id} (attempt {attempt + 1}), "
+                f"retrying in {delay:.2f}s"
+            )
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return limiter state for every model seen so far"""
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {model_id: limiter.stats() for model_id, limiter in limiters.items()}
+
+
+# Global instance
+bedrock_scheduler = BedrockScheduler()
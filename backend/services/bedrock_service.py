@@ -1,10 +1,32 @@
-import boto3
 import json
 import os
 import logging
+import threading
+from typing import Any, Dict, Optional
+from .bedrock_scheduler import PRIORITY_INTERACTIVE, bedrock_scheduler
+from .lazy_init import InitRetry
+from .metrics import BEDROCK_TOKENS
+from .tracing import trace_boto_client, traced
 
 logger = logging.getLogger(__name__)
 
+# Claude models on Bedrock that accept cache_control checkpoints
+PROMPT_CACHING_MODEL_MARKERS = (
+    "claude-3-5-haiku",
+    "claude-3-7-sonnet",
+    "claude-sonnet-4",
+    "claude-opus-4",
+    "claude-haiku-4",
+)
+
+# Bedrock ignores checkpoints on prefixes shorter than the model's minimum
+# cacheable length; Haiku models need twice the usual 1024 tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_MIN_TOKENS_HAIKU = 2048
+# Conservative characters-per-token for English, so short prefixes are never
+# mistaken for cacheable ones
+CHARS_PER_TOKEN = 5
+
 
 class BedrockService:
     """Service class for AWS Bedrock interactions"""
@@ -12,29 +34,53 @@ class BedrockService:
     def __init__(self):
         self.client = None
         self._initialized = False
+        self.claude_model_id = os.getenv(
+            "CLAUDE_MODEL_ID", "anthropic.claude-3-sonnet-20240229-v1:0"
+        )
+        self.titan_text_model_id = os.getenv(
+            "TITAN_TEXT_MODEL_ID", "amazon.titan-text-express-v1"
+        )
+        self.prompt_caching = os.getenv("BEDROCK_PROMPT_CACHING", "auto").lower()
+        self._usage: Dict[str, Dict[str, int]] = {}
+        self._usage_lock = threading.Lock()
+        self._init = InitRetry("Bedrock client")
 
     def _initialize_client(self):
-        """Initialize AWS Bedrock client (lazy loading)"""
+        """Initialize AWS Bedrock client (lazy loading, retried with backoff on failure)"""
         if self._initialized:
             return self.client
 
-        try:
-            # Get AWS region from environment
-            aws_region = os.getenv("AWS_REGION", "us-east-1")
-
-            self.client = boto3.client(
-                "bedrock-runtime",
-                region_name=aws_region,
-                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            )
-            logger.info("AWS Bedrock client initialized successfully")
-            self._initialized = True
+        with self._init.lock:
+            # Another thread may have initialized it while this one waited, and
+            # a recent failure is not retried until its backoff has elapsed
+            if self._initialized or not self._init.ready():
+                return self.client
+
+            try:
+                # Deferred so app startup and /health do not pay for importing boto3
+                import boto3
+                from botocore.config import Config
+
+                # Get AWS region from environment
+                aws_region = os.getenv("AWS_REGION", "us-east-1")
+
+                self.client = boto3.session.Session().client(
+                    "bedrock-runtime",
+                    region_name=aws_region,
+                    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                    # Throttles and transient errors are retried by bedrock_scheduler
+                    config=Config(retries={"max_attempts": 1, "mode": "standard"}),
+                )
+                trace_boto_client(self.client)
+                logger.info("AWS Bedrock client initialized successfully")
+                self._initialized = True
+                self._init.succeeded()
+            except Exception as e:
+                logger.error(f"Failed to initialize AWS Bedrock client: {e}")
+                self.client = None
+                self._init.failed(e)
             return self.client
-        except Exception as e:
-            logger.error(f"Failed to initialize AWS Bedrock client: {e}")
-            self._initialized = True
-            return None
 
     def is_available(self) -> bool:
         """Check if Bedrock client is available"""
@@ -42,8 +88,99 @@ class BedrockService:
             self._initialize_client()
         return self.client is not None
 
-    def invoke_claude(self, prompt: str, max_tokens: int = 1000) -> str:
-        """Invoke Claude 3 model via AWS Bedrock"""
+    def supports_prompt_caching(self, model_id: Optional[str] = None) -> bool:
+        """Whether the Claude model accepts cache_control on the system prefix"""
+        if self.prompt_caching in ("off", "false", "0"):
+            return False
+        if self.prompt_caching in ("on", "true", "1"):
+            return True
+        model_id = model_id or self.claude_model_id
+        return any(marker in model_id for marker in PROMPT_CACHING_MODEL_MARKERS)
+
+    def is_cacheable_prefix(self, system: str, model_id: Optional[str] = None) -> bool:
+        """Whether a system prefix is long enough for the model to cache it"""
+        model_id = model_id or self.claude_model_id
+        min_tokens = (
+            PROMPT_CACHE_MIN_TOKENS_HAIKU if "haiku" in model_id else PROMPT_CACHE_MIN_TOKENS
+        )
+        return len(system) // CHARS_PER_TOKEN >= min_tokens
+
+    def _record_usage(
+        self,
+        model_id: str,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ):
+        """Accumulate token usage per model, split into cached and uncached input"""
+        with self._usage_lock:
+            usage = self._usage.setdefault(
+                model_id,
+                {
+                    "calls": 0,
+                    "input_tokens": 0,
+                    "cache_read_input_tokens": 0,
+                    "cache_write_input_tokens": 0,
+                    "output_tokens": 0,
+                },
+            )
+            usage["calls"] += 1
+            usage["input_tokens"] += input_tokens
+            usage["cache_read_input_tokens"] += cache_read_tokens
+            usage["cache_write_input_tokens"] += cache_write_tokens
+            usage["output_tokens"] += output_tokens
+
+        for kind, tokens in (
+            ("input", input_tokens),
+            ("output", output_tokens),
+            ("cache_read", cache_read_tokens),
+            ("cache_write", cache_write_tokens),
+        ):
+            if tokens:
+                BEDROCK_TOKENS.labels(model_id=model_id, kind=kind).inc(tokens)
+
+        logger.info(
+            f"Bedrock usage for {model_id}: {input_tokens} uncached input, "
+            f"{cache_read_tokens} cached input, {cache_write_tokens} cache write, "
+            f"{output_tokens} output tokens"
+        )
+
+    def get_usage_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return cumulative token usage per model since process start"""
+        with self._usage_lock:
+            stats = {}
+            for model_id, usage in self._usage.items():
+                total_input = (
+                    usage["input_tokens"]
+                    + usage["cache_read_input_tokens"]
+                    + usage["cache_write_input_tokens"]
+                )
+                stats[model_id] = dict(
+                    usage,
+                    cache_hit_ratio=(
+                        usage["cache_read_input_tokens"] / total_input
+                        if total_input
+                        else 0.0
+                    ),
+                )
+            return stats
+
+    @traced("bedrock_service.invoke_claude")
+    def invoke_claude(
+        self,
+        prompt: str,
+        max_tokens: int = 1000,
+        system: Optional[str] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> str:
+        """
+        Invoke Claude 3 model via AWS Bedrock
+
+        Static instructions go in system so they form a shared prefix; it is marked
+        as a prompt cache checkpoint when the configured model supports caching
+        and the prefix reaches the model's minimum cacheable length.
+        """
         if not self._initialized:
             self._initialize_client()
         if not self.client:
@@ -57,20 +194,46 @@ class BedrockService:
                 "temperature": 0.7,
                 "top_p": 0.9,
             }
+            if system:
+                if self.supports_prompt_caching() and self.is_cacheable_prefix(system):
+                    body["system"] = [
+                        {
+                            "type": "text",
+                            "text": system,
+                            "cache_control": {"type": "ephemeral"},
+                        }
+                    ]
+                else:
+                    body["system"] = system
 
-            response = self.client.invoke_model(
-                modelId="anthropic.claude-3-sonnet-20240229-v1:0", body=json.dumps(body)
+            response = bedrock_scheduler.invoke_model(
+                self.client, self.claude_model_id, json.dumps(body), priority
             )
 
             response_body = json.loads(response["body"].read())
+            usage = response_body.get("usage", {})
+            self._record_usage(
+                self.claude_model_id,
+                input_tokens=usage.get("input_tokens", 0),
+                output_tokens=usage.get("output_tokens", 0),
+                cache_read_tokens=usage.get("cache_read_input_tokens", 0),
+                cache_write_tokens=usage.get("cache_creation_input_tokens", 0),
+            )
             return response_body["content"][0]["text"]
 
         except Exception as e:
             logger.error(f"Error invoking Claude: {e}")
             raise
 
-    def invoke_titan_text(self, prompt: str, max_tokens: int = 1000) -> str:
-        """Invoke Amazon Titan text model via AWS Bedrock"""
+    @traced("bedrock_service.invoke_titan_text")
+    def invoke_titan_text(
+        self,
+        prompt: str,
+        max_tokens: int = 1000,
+        system: Optional[str] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> str:
+        """Invoke Amazon Titan text model via AWS Bedrock (no system role, so it is prepended)"""
         if not self._initialized:
             self._initialize_client()
         if not self.client:
@@ -78,7 +241,7 @@ class BedrockService:
 
         try:
             body = {
-                "inputText": prompt,
+                "inputText": f"{system}\n\n{prompt}" if system else prompt,
                 "textGenerationConfig": {
                     "maxTokenCount": max_tokens,
                     "temperature": 0.7,
@@ -87,12 +250,18 @@ class BedrockService:
                 },
             }
 
-            response = self.client.invoke_model(
-                modelId="amazon.titan-text-express-v1", body=json.dumps(body)
+            response = bedrock_scheduler.invoke_model(
+                self.client, self.titan_text_model_id, json.dumps(body), priority
             )
 
             response_body = json.loads(response["body"].read())
-            return response_body["results"][0]["outputText"]
+            result = response_body["results"][0]
+            self._record_usage(
+                self.titan_text_model_id,
+                input_tokens=response_body.get("inputTextTokenCount", 0),
+                output_tokens=result.get("tokenCount", 0),
+            )
+            return result["outputText"]
 
         except Exception as e:
             logger.error(f"Error invoking Titan: {e}")
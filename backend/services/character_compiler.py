@@ -0,0 +1,107 @@
+from typing import Dict, List, Tuple
+from .prompt_fitter import prompt_limit
+
+GENDER_NOUNS = {
+    "male": "man",
+    "female": "woman",
+    "non-binary": "non-binary person",
+}
+
+# Lower numbers are kept longest when the prompt has to be shortened
+PRIORITY_HIGH = 1
+PRIORITY_MEDIUM = 2
+PRIORITY_LOW = 3
+
+
+def _clean(features: Dict, key: str) -> str:
+    """Return a stripped feature value, treating missing/None as empty"""
+    value = features.get(key) or ""
+    return str(value).strip()
+
+
+def _subject(features: Dict, base_prompt: str) -> str:
+    """Build the leading subject phrase, e.g. 'A 26-35 year old Asian woman, ...'"""
+    age = _clean(features, "age")
+    gender = _clean(features, "gender")
+    ethnicity = _clean(features, "ethnicity")
+
+    words = []
+    if age:
+        words.append(f"{age} year old")
+    if ethnicity and ethnicity.lower() != "other":
+        words.append(ethnicity)
+    if gender:
+        words.append(GENDER_NOUNS.get(gender.lower(), gender.lower()))
+    elif words:
+        words.append("person")
+
+    base = base_prompt.strip().rstrip(".") if base_prompt else ""
+    if not words:
+        return base or "AI influencer"
+
+    article = "An" if words[0][0].lower() in "aeiou8" or words[0].startswith("18") else "A"
+    subject = f"{article} {' '.join(words)}"
+    return f"{subject}, {base}" if base else f"{subject} AI influencer"
+
+
+def _phrases(features: Dict) -> List[Tuple[int, str]]:
+    """Turn the remaining character features into (priority, phrase) pairs in prompt order"""
+    get = lambda key: _clean(features, key).lower()
+    phrases = []
+
+    hair_color, hair_style = get("hair_color"), get("hair_style")
+    if hair_color or hair_style:
+        hair = " ".join(part for part in (hair_style, hair_color) if part)
+        phrases.append((PRIORITY_HIGH, f"{hair} hair"))
+    if get("body_type"):
+        phrases.append((PRIORITY_LOW, f"{get('body_type')} build"))
+    if get("expression"):
+        phrases.append((PRIORITY_MEDIUM, f"{get('expression')} expression"))
+    if get("personality"):
+        phrases.append((PRIORITY_LOW, f"{get('personality')} personality"))
+    if get("confidence_level"):
+        phrases.append((PRIORITY_LOW, f"{get('confidence_level')} demeanor"))
+    if get("fashion_style"):
+        phrases.append((PRIORITY_MEDIUM, f"{get('fashion_style')} fashion"))
+    if get("overall_vibe"):
+        phrases.append((PRIORITY_LOW, f"{get('overall_vibe')} aesthetic"))
+    if get("background"):
+        phrases.append((PRIORITY_MEDIUM, f"{get('background')} background"))
+    if get("lighting_style"):
+        lighting = get("lighting_style")
+        if "light" not in lighting:
+            lighting += " lighting"
+        phrases.append((PRIORITY_MEDIUM, lighting))
+    if get("photo_type"):
+        phrases.append((PRIORITY_HIGH, f"{get('photo_type')} shot"))
+    return phrases
+
+
+def compile_character_prompt(
+    character_features: Dict, base_prompt: str = "", image_model: str = "titan-g1"
+) -> str:
+    """
+    Compile character builder selections into an image prompt without an LLM
+
+    Features are emitted in a fixed order; when the result exceeds the image
+    model's prompt limit the lowest-priority phrases are dropped first.
+    """
+    limit = prompt_limit(image_model)
+    subject = _subject(character_features or {}, base_prompt or "")
+    phrases = _phrases(character_features or {})
+
+    def render(items: List[Tuple[int, str]]) -> str:
+        if not items:
+            return f"{subject}."
+        return f"{subject}, " + ", ".join(text for _, text in items) + "."
+
+    prompt = render(phrases)
+    while len(prompt) > limit and phrases:
+        # Drop the last phrase among those with the lowest importance
+        worst = max(range(len(phrases)), key=lambda i: (phrases[i][0], i))
+        phrases.pop(worst)
+        prompt = render(phrases)
+
+    if len(prompt) > limit:
+        prompt = prompt[:limit].rsplit(" ", 1)[0].rstrip(",")
+    return prompt
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the model's breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker over a rolling window of call outcomes and latencies
+
+    Calls slower than slow_call_seconds count as failures. The breaker opens when
+    the failure rate over the window reaches failure_threshold, rejects calls for
+    open_seconds, then lets a single probe through (half-open) to decide whether
+    to close again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 60.0,
+        min_calls: int = 5,
+        failure_threshold: float = 0.5,
+        slow_call_seconds: float = 30.0,
+        open_seconds: float = 30.0,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._calls = deque()  # (timestamp, failed, latency)
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+    def allow_request(self) -> bool:
+        """Whether a call may proceed; moves an expired open breaker to half-open"""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return False
+                self.state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record(self, succeeded: bool, latency: float):
+        """Record a call outcome and update the breaker state"""
+        failed = not succeeded or latency >= self.slow_call_seconds
+        now = time.monotonic()
+        with self._lock:
+            if self.state == STATE_HALF_OPEN:
+                self._probe_in_flight = False
+                if failed:
+                    self.state = STATE_OPEN
+                    self._opened_at = now
+                else:
+                    self.state = STATE_CLOSED
+                    self._calls.clear()
+                return
+
+            self._calls.append((now, failed, latency))
+            self._prune(now)
+            failures = sum(1 for _, f, _ in self._calls if f)
+            if (
+                self.state == STATE_CLOSED
+                and len(self._calls) >= self.min_calls
+                and failures / len(self._calls) >= self.failure_threshold
+            ):
+                self.state = STATE_OPEN
+                self._opened_at = now
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return state plus window statistics for health reporting"""
+        with self._lock:
+            self._prune(time.monotonic())
+            calls = len(self._calls)
+            failures = sum(1 for _, f, _ in self._calls if f)
+            latencies = sorted(l for _, _, l in self._calls)
+            state = self.state
+            if state == STATE_OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                state = STATE_HALF_OPEN
+        return {
+            "state": state,
+            "calls": calls,
+            "failure_rate": round(failures / calls, 3) if calls else 0.0,
+            "p50_latency": round(latencies[calls // 2], 3) if calls else None,
+            "max_latency": round(latencies[-1], 3) if calls else None,
+        }
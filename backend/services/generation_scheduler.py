@@ -0,0 +1,208 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional
+
+from .metrics import (
+    GENERATION_IN_FLIGHT,
+    GENERATION_QUEUE_DEPTH,
+    GENERATION_QUEUE_SECONDS,
+    GENERATION_REJECTIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+TIER_STANDARD = "standard"
+TIER_PREMIUM = "premium"
+
+
+class GenerationQueueFullError(Exception):
+    """Raised when a generation request is refused admission to the queue"""
+
+
+class GenerationQueueTimeoutError(GenerationQueueFullError):
+    """Raised when an admitted request waits longer than its queue timeout"""
+
+
+def generation_cost(width: int, height: int) -> float:
+    """Share of a slot's time an image takes, relative to a 1024x1024 image"""
+    # Larger images hold a slot longer, so they cost more of the user's share
+    return max(0.25, width * height / (1024 * 1024))
+
+
+class FairScheduler:
+    """
+    Weighted fair queue of image generations across users
+
+    Uses start-time fair queuing: each request is tagged with a start time of
+    max(virtual time, its user's previous finish) and a finish of start plus
+    cost / weight, and the free slot goes to the smallest start tag. A user
+    with dozens of queued requests therefore gets its share of slots, while a
+    newcomer is served next instead of behind them; premium users get weight
+    times the share of a standard user. Admission is refused once the queue, or
+    the user's part of it, is full, rather than letting waits grow unbounded.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int = 200,
+        max_queue_per_user: int = 40,
+        queue_timeout: float = 30.0,
+        premium_weight: float = 4.0,
+        premium_users: Iterable[str] = (),
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+        self.premium_weight = premium_weight
+        self.premium_users = frozenset(premium_users)
+        self.in_flight = 0
+        self.rejections = 0
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[str, float] = {}
+        self._queued_by_user: Dict[str, int] = {}
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def tier(self, user: str) -> str:
+        return TIER_PREMIUM if user in self.premium_users else TIER_STANDARD
+
+    def weight(self, user: str) -> float:
+        return self.premium_weight if self.tier(user) == TIER_PREMIUM else 1.0
+
+    def has_room(self, user: str, count: int = 1) -> bool:
+        """Whether count more requests from user would currently be admitted"""
+        with self._cond:
+            return (
+                len(self._waiters) + count <= self.max_queue
+                and self._queued_by_user.get(user, 0) + count <= self.max_queue_per_user
+            )
+
+    def _reject(self, user: str, reason: str, message: str):
+        self.rejections += 1
+        GENERATION_REJECTIONS.labels(tier=self.tier(user), reason=reason).inc()
+        raise GenerationQueueFullError(message)
+
+    def acquire(self, user: str, cost: float = 1.0, timeout: Optional[float] = 30.0):
+        """
+        Block until this request holds a slot; raises when refused or timed out
+
+        A timeout of None waits as long as it takes, for background work.
+        """
+        tier = self.tier(user)
+        with self._cond:
+            if len(self._waiters) >= self.max_queue:
+                self._reject(user, "queue_full", "Image generation is at capacity, retry shortly")
+            queued = self._queued_by_user.get(user, 0)
+            if queued >= self.max_queue_per_user:
+                self._reject(
+                    user, "user_queue_full", "Too many of your generations are already queued"
+                )
+
+            start = max(self._virtual_time, self._finish_tags.get(user, 0.0))
+            self._finish_tags[user] = start + cost / self.weight(user)
+            ticket = (start, next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+            self._queued_by_user[user] = queued + 1
+            GENERATION_QUEUE_DEPTH.labels(tier=tier).inc()
+            queued_at = time.monotonic()
+            deadline = None if timeout is None else queued_at + timeout
+
+            try:
+                while self._waiters[0] != ticket or self.in_flight >= self.max_concurrency:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._waiters.remove(ticket)
+                        heapq.heapify(self._waiters)
+                        # Give back the share the abandoned request reserved
+                        self._finish_tags[user] -= cost / self.weight(user)
+                        self._cond.notify_all()
+                        raise GenerationQueueTimeoutError(
+                            "Timed out waiting for an image generation slot"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._leave_queue(user)
+                GENERATION_QUEUE_DEPTH.labels(tier=tier).dec()
+
+            heapq.heappop(self._waiters)
+            self._virtual_time = max(self._virtual_time, start)
+            self.in_flight += 1
+            GENERATION_IN_FLIGHT.inc()
+            GENERATION_QUEUE_SECONDS.labels(tier=tier).observe(time.monotonic() - queued_at)
+            self._prune()
+            # The next waiter may also fit under the limit
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            GENERATION_IN_FLIGHT.dec()
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, user: str, cost: float = 1.0, timeout: Optional[float] = None):
+        """Hold a generation slot for the duration of the block"""
+        self.acquire(user, cost, self.queue_timeout if timeout is None else timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _leave_queue(self, user: str):
+        remaining = self._queued_by_user[user] - 1
+        if remaining:
+            self._queued_by_user[user] = remaining
+        else:
+            del self._queued_by_user[user]
+
+    def _prune(self):
+        # A user whose last finish tag is behind virtual time has no credit or
+        # debt left, so forgetting it changes nothing
+        if len(self._finish_tags) > 2 * (len(self._queued_by_user) + 100):
+            self._finish_tags = {
+                user: finish
+                for user, finish in self._finish_tags.items()
+                if finish > self._virtual_time or user in self._queued_by_user
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        """Return slot usage, queue depth and the heaviest queued users"""
+        with self._cond:
+            heaviest = sorted(self._queued_by_user.items(), key=lambda item: -item[1])[:5]
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "max_queue": self.max_queue,
+                "users_queued": len(self._queued_by_user),
+                "top_queued": [{"user": user, "queued": count} for user, count in heaviest],
+                "rejections": self.rejections,
+            }
+
+
+def _premium_users():
+    # X-User-ID values, as keyed by routes.rate_limit.request_user_key
+    return {
+        f"user:{user_id.strip()}"
+        for user_id in os.getenv("GENERATION_PREMIUM_USERS", "").split(",")
+        if user_id.strip()
+    }
+
+
+# Global instance
+generation_scheduler = FairScheduler(
+    max_concurrency=int(os.getenv("GENERATION_MAX_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("GENERATION_MAX_QUEUE", "200")),
+    max_queue_per_user=int(os.getenv("GENERATION_MAX_QUEUE_PER_USER", "40")),
+    queue_timeout=float(os.getenv("GENERATION_QUEUE_TIMEOUT", "30")),
+    premium_weight=float(os.getenv("GENERATION_PREMIUM_WEIGHT", "4")),
+    premium_users=_premium_users(),
+)
@@ -0,0 +1,288 @@
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+from .image_encoding import get_profile
+from .metrics import IMAGE_CODEC_PENDING
+from .tracing import set_attributes, traced
+
+logger = logging.getLogger(__name__)
+
+# Headroom added to the output segment for container overhead of the encoded image
+_OUTPUT_SLACK_BYTES = 64 * 1024
+
+
+class CodecBusyError(Exception):
+    """Raised when the codec queue stays full for longer than the queue timeout"""
+
+
+def fetch_image_bytes(url: str) -> bytes:
+    """Return the raw bytes of a data URL or an http(s) image URL"""
+    if url.startswith("data:"):
+        _, data = url.split(",", 1)
+        return base64.b64decode(data)
+
+    import requests
+
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+
+def _encode(img, profile_id: str) -> bytes:
+    """Encode a Pillow image with the options of an encoding profile"""
+    profile = get_profile(profile_id)
+    has_alpha = "A" in img.getbands() or "transparency" in img.info
+    mode = "RGBA" if has_alpha and profile.supports_alpha else "RGB"
+    if img.mode != mode:
+        img = img.convert(mode)
+    buffer = io.BytesIO()
+    img.save(buffer, format=profile.pillow_format, **profile.save_options)
+    return buffer.getvalue()
+
+
+def _merge_side_by_side(images: List[bytes], width: int, height: int, profile: str):
+    """Resize each image to width x height and paste them left to right"""
+    from PIL import Image
+
+    merged = Image.new("RGB", (width * len(images), height))
+    for index, data in enumerate(images):
+        with Image.open(io.BytesIO(data)) as img:
+            merged.paste(img.resize((width, height), Image.Resampling.LANCZOS), (index * width, 0))
+    return _encode(merged, profile)
+
+
+def _transcode(images: List[bytes], profile: str):
+    """Re-encode a single image with another profile"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(images[0])) as img:
+        return _encode(img, profile)
+
+
+# Operations a worker process can run, keyed by the name passed to ImageCodec.run
+_OPERATIONS = {
+    "merge": _merge_side_by_side,
+    "transcode": _transcode,
+}
+
+
+def _worker_run(
+    operation: str,
+    input_name: str,
+    offsets: List[Tuple[int, int]],
+    output_name: str,
+    params: Dict[str, Any],
+):
+    """
+    Worker process entry point
+
+    Reads the input blobs from the shared input segment, runs the operation and
+    writes the encoded result into the shared output segment. Returns the
+    output length, or the bytes themselves if they do not fit in the segment.
+    """
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    try:
+        images = [bytes(input_shm.buf[start:end]) for start, end in offsets]
+    finally:
+        input_shm.close()
+
+    result = _OPERATIONS[operation](images, **params)
+
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    try:
+        if len(result) > output_shm.size:
+            return result
+        output_shm.buf[: len(result)] = result
+        return len(result)
+    finally:
+        output_shm.close()
+
+
+class ImageCodec:
+    """
+    Runs Pillow decode/resize/encode work in a bounded process pool
+
+    Keeps CPU-bound image work off request threads so it cannot hold the GIL
+    of the web worker. Input and output bytes move through shared memory
+    segments owned by the calling process instead of being pickled through the
+    pool's pipes, and at most max_pending operations may be queued or running;
+    callers beyond that wait up to queue_timeout and then get CodecBusyError.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        queue_timeout: float = 10.0,
+        task_timeout: float = 60.0,
+        max_merge_side: int = 2048,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self.queue_timeout = queue_timeout
+        self.task_timeout = task_timeout
+        self.max_merge_side = max_merge_side
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # Counters are updated from request threads and pool done-callbacks
+        self._stats_lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn avoids forking a multi-threaded web worker
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                logger.info(f"Image codec pool started with {self.max_workers} workers")
+            return self._pool
+
+    def _reset_pool(self, pool: ProcessPoolExecutor):
+        """Drop a broken pool so the next call starts a fresh one"""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @traced("image_codec.run")
+    def run(self, operation: str, inputs: List[bytes], output_size: int, **params) -> bytes:
+        """Run a codec operation on inputs; output_size bounds the encoded result"""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._stats_lock:
+                self.rejected += 1
+            raise CodecBusyError("Image processing queue is full, please retry shortly")
+
+        input_shm = output_shm = None
+        # Set when the wait timed out while a worker still runs the task
+        running: Optional[Future] = None
+        with self._stats_lock:
+            self.pending += 1
+        IMAGE_CODEC_PENDING.inc()
+        try:
+            input_shm = shared_memory.SharedMemory(
+                create=True, size=max(1, sum(len(data) for data in inputs))
+            )
+            offsets = []
+            position = 0
+            for data in inputs:
+                input_shm.buf[position : position + len(data)] = data
+                offsets.append((position, position + len(data)))
+                position += len(data)
+
+            output_shm = shared_memory.SharedMemory(
+                create=True, size=output_size + _OUTPUT_SLACK_BYTES
+            )
+
+            pool = self._executor()
+            future = pool.submit(
+                _worker_run, operation, input_shm.name, offsets, output_shm.name, params
+            )
+            try:
+                result = future.result(timeout=self.task_timeout)
+            except BrokenProcessPool:
+                self._reset_pool(pool)
+                raise
+            except TimeoutError:
+                if not future.cancel():
+                    running = future
+                raise
+
+            with self._stats_lock:
+                self.completed += 1
+            if not isinstance(result, bytes):
+                result = bytes(output_shm.buf[:result])
+            set_attributes(
+                **{
+                    "image_codec.operation": operation,
+                    "request.size": position,
+                    "response.size": len(result),
+                }
+            )
+            return result
+        finally:
+            if running is not None:
+                # The worker still reads and writes the segments and occupies the
+                # pool, so they and the slot are released only once it finishes
+                running.add_done_callback(lambda _: self._finish(input_shm, output_shm))
+            else:
+                self._finish(input_shm, output_shm)
+
+    def _finish(self, *segments: Optional[shared_memory.SharedMemory]):
+        """Free an operation's shared memory and its slot"""
+        with self._stats_lock:
+            self.pending -= 1
+        IMAGE_CODEC_PENDING.dec()
+        for shm in segments:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self._slots.release()
+
+    def check_merge_size(self, width, height) -> Tuple[int, int]:
+        """Check a merge's per-image width and height are positive ints within max_merge_side"""
+        for name, value in (("width", width), ("height", height)):
+            if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+                raise ValueError(f"target_{name} must be a positive integer")
+            if value > self.max_merge_side:
+                raise ValueError(f"target_{name} must be at most {self.max_merge_side}")
+        return width, height
+
+    def merge_side_by_side(
+        self, images: List[bytes], width: int, height: int, profile: str = "flux_input"
+    ) -> bytes:
+        """Resize images to width x height, place them side by side and encode with profile"""
+        self.check_merge_size(width, height)
+        get_profile(profile)  # fail fast on unknown profiles
+        # Worst case for any profile is roughly the raw RGB size
+        output_size = width * len(images) * height * 3
+        return self.run("merge", images, output_size, width=width, height=height, profile=profile)
+
+    def transcode(self, data: bytes, profile: str) -> bytes:
+        """Re-encode an image with an encoding profile"""
+        get_profile(profile)
+        # Larger results (e.g. JPEG to lossless PNG) are returned through the pool's pipe
+        return self.run("transcode", [data], len(data) * 8, profile=profile)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def _optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+# Global instance
+image_codec = ImageCodec(
+    max_workers=_optional_int("IMAGE_CODEC_WORKERS"),
+    max_pending=_optional_int("IMAGE_CODEC_MAX_PENDING"),
+    queue_timeout=float(os.getenv("IMAGE_CODEC_QUEUE_TIMEOUT", "10")),
+    task_timeout=float(os.getenv("IMAGE_CODEC_TASK_TIMEOUT", "60")),
+    max_merge_side=int(os.getenv("IMAGE_CODEC_MAX_MERGE_SIDE", "2048")),
+)
@@ -0,0 +1,83 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """How images produced for one use are encoded"""
+
+    id: str
+    pillow_format: str
+    content_type: str
+    save_options: Dict[str, Any] = field(default_factory=dict)
+    supports_alpha: bool = True
+
+
+ENCODING_PROFILES: Dict[str, EncodingProfile] = {
+    profile.id: profile
+    for profile in (
+        # Merged images sent to FLUX Kontext: fast to encode and small to upload
+        EncodingProfile(
+            id="flux_input",
+            pillow_format="JPEG",
+            content_type="image/jpeg",
+            save_options={"quality": 90, "subsampling": "4:2:0"},
+            supports_alpha=False,
+        ),
+        # Images served back to browsers from the gallery and explore pages
+        EncodingProfile(
+            id="gallery",
+            pillow_format="WEBP",
+            content_type="image/webp",
+            save_options={"quality": 85, "method": 4},
+        ),
+        # Lossless copies where size matters more than encode time
+        EncodingProfile(
+            id="archive",
+            pillow_format="PNG",
+            content_type="image/png",
+            save_options={"optimize": True},
+        ),
+    )
+}
+
+# Profile used when storing generations; "original" keeps the uploaded bytes as-is
+STORAGE_IMAGE_PROFILE = os.getenv("STORAGE_IMAGE_PROFILE", "gallery")
+
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+_EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+
+
+def get_profile(profile_id: str) -> EncodingProfile:
+    """Look up an encoding profile, raising ValueError for unknown ids"""
+    profile = ENCODING_PROFILES.get(profile_id)
+    if not profile:
+        raise ValueError(f"Unsupported encoding profile: {profile_id}")
+    return profile
+
+
+def detect_content_type(data: bytes) -> str:
+    """Detect an image's content type from its leading bytes"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in _SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    return "application/octet-stream"
+
+
+def extension_for(content_type: str) -> str:
+    """File extension used for S3 keys of the given content type"""
+    return _EXTENSIONS.get(content_type, "bin")
@@ -1,11 +1,21 @@
-import boto3
 import json
 import base64
 import logging
 import os
-import requests
+import random
+import threading
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from .bedrock_scheduler import PRIORITY_INTERACTIVE, bedrock_scheduler
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .generation_scheduler import generation_cost, generation_scheduler
+from .image_providers import IMAGE_PROVIDERS, ImageProvider, get_provider
+from .job_registry import JOB_MODERATED, Job
+from .lazy_init import InitRetry
+from .metrics import FLUX_JOB_SECONDS, FLUX_POLL_ATTEMPTS
+from .prompt_fitter import fit_prompt, prompt_limit
+from .result_cache import result_cache
+from .tracing import set_attributes, trace_boto_client, traced
 
 logger = logging.getLogger(__name__)
 
@@ -17,162 +27,92 @@ class ImageGenerationService:
         self.bedrock_client = None
         self._bedrock_initialized = False
         self.flux_api_key = None  # Will be set from environment
-        self.flux_base_url = "https://api.bfl.ai/v1"
+        self.flux_base_url = os.getenv("FLUX_BASE_URL", "https://api.bfl.ai/v1")
+        self.fallback_routing = (
+            os.getenv("IMAGE_MODEL_FALLBACK", "false").lower() == "true"
+        )
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        self._init = InitRetry("Image Bedrock client")
+        self.result_cache = result_cache
 
     def _initialize_bedrock_client(self):
-        """Initialize Bedrock client (lazy loading)"""
+        """Initialize Bedrock client (lazy loading, retried with backoff on failure)"""
         if self._bedrock_initialized:
             return
 
-        try:
-            # Get AWS region from environment
-            aws_region = os.getenv("AWS_REGION", "us-east-1")
-
-            self.bedrock_client = boto3.client(
-                "bedrock-runtime",
-                region_name=aws_region,
-                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            )
-            logger.info("AWS Bedrock client initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize AWS Bedrock client: {e}")
-            self.bedrock_client = None
-
-        self._bedrock_initialized = True
+        with self._init.lock:
+            # Another thread may have initialized it while this one waited, and
+            # a recent failure is not retried until its backoff has elapsed
+            if self._bedrock_initialized or not self._init.ready():
+                return
+
+            try:
+                # Deferred so app startup and /health do not pay for importing boto3
+                import boto3
+                from botocore.config import Config
+
+                # Get AWS region from environment
+                aws_region = os.getenv("AWS_REGION", "us-east-1")
+
+                self.bedrock_client = boto3.session.Session().client(
+                    "bedrock-runtime",
+                    region_name=aws_region,
+                    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                    # Throttles and transient errors are retried by bedrock_scheduler
+                    config=Config(retries={"max_attempts": 1, "mode": "standard"}),
+                )
+                trace_boto_client(self.bedrock_client)
+                logger.info("AWS Bedrock client initialized successfully")
+                self._bedrock_initialized = True
+                self._init.succeeded()
+            except Exception as e:
+                logger.error(f"Failed to initialize AWS Bedrock client: {e}")
+                self.bedrock_client = None
+                self._init.failed(e)
 
     def set_flux_api_key(self, api_key: str):
         """Set the FLUX API key"""
         self.flux_api_key = api_key
 
-    def generate_with_titan_g1(
-        self, prompt: str, width: int = 1024, height: int = 1024
-    ) -> str:
-        """Generate image using Titan Image Generator G1"""
-        if not self._bedrock_initialized:
-            self._initialize_bedrock_client()
-        if not self.bedrock_client:
-            raise Exception("AWS Bedrock client not initialized")
-
-        try:
-            body = {
-                "taskType": "TEXT_IMAGE",
-                "textToImageParams": {"text": prompt},
-                "imageGenerationConfig": {
-                    "numberOfImages": 1,
-                    "width": width,
-                    "height": height,
-                    "cfgScale": 8.0,
-                    "seed": 0,
-                },
-            }
-
-            response = self.bedrock_client.invoke_model(
-                modelId="amazon.titan-image-generator-v1", body=json.dumps(body)
-            )
-
-            response_body = json.loads(response["body"].read())
-            return response_body["images"][0]
-
-        except Exception as e:
-            logger.error(f"Error generating image with Titan G1: {e}")
-            raise
-
-    def generate_with_titan_g2(
-        self, prompt: str, width: int = 1024, height: int = 1024
-    ) -> str:
-        """Generate image using Titan Image Generator G1 v2"""
-        if not self._bedrock_initialized:
-            self._initialize_bedrock_client()
-        if not self.bedrock_client:
-            raise Exception("AWS Bedrock client not initialized")
-
-        try:
-            body = {
-                "taskType": "TEXT_IMAGE",
-                "textToImageParams": {"text": prompt},
-                "imageGenerationConfig": {
-                    "numberOfImages": 1,
-                    "width": width,
-                    "height": height,
-                    "cfgScale": 8.0,
-                    "seed": 0,
-                },
-            }
-
-            response = self.bedrock_client.invoke_model(
-                modelId="amazon.titan-image-generator-v2:0", body=json.dumps(body)
-            )
-
-            response_body = json.loads(response["body"].read())
-            return response_body["images"][0]
-
-        except Exception as e:
-            logger.error(f"Error generating image with Titan G2: {e}")
-            raise
-
-    def generate_with_nova_canvas(
-        self, prompt: str, width: int = 1024, height: int = 1024
-    ) -> str:
-        """Generate image using Nova Canvas"""
-        if not self._bedrock_initialized:
-            self._initialize_bedrock_client()
-        if not self.bedrock_client:
-            raise Exception("AWS Bedrock client not initialized")
-
-        try:
-            body = {
-                "taskType": "TEXT_IMAGE",
-                "textToImageParams": {"text": prompt},
-                "imageGenerationConfig": {
-                    "numberOfImages": 1,
-                    "width": width,
-                    "height": height,
-                    "cfgScale": 8.0,
-                },
-            }
-
-            response = self.bedrock_client.invoke_model(
-                modelId="amazon.nova-canvas-v1:0", body=json.dumps(body)
+    def _validate_request(
+        self, provider: ImageProvider, width: int, height: int, count: int = 1
+    ):
+        """Reject sizes and batch sizes the model does not support"""
+        if not provider.supports_size(width, height):
+            raise ValueError(f"Unsupported size {width}x{height} for {provider.id}")
+        if count > provider.max_batch_size:
+            raise ValueError(
+                f"{provider.id} generates at most {provider.max_batch_size} images per request"
             )
 
-            response_body = json.loads(response["body"].read())
-            return response_body["images"][0]
-
-        except Exception as e:
-            logger.error(f"Error generating image with Nova Canvas: {e}")
-            raise
-
-    def generate_with_sdxl(
-        self, prompt: str, width: int = 1024, height: int = 1024
-    ) -> str:
-        """Generate image using SDXL 1.0"""
+    @traced("image_service.invoke_provider")
+    def _invoke_provider(
+        self,
+        provider: ImageProvider,
+        body: Dict[str, Any],
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> List[str]:
+        """Invoke a provider's Bedrock model with a built request and parse the images"""
         if not self._bedrock_initialized:
             self._initialize_bedrock_client()
         if not self.bedrock_client:
             raise Exception("AWS Bedrock client not initialized")
 
         try:
-            body = {
-                "text_prompts": [{"text": prompt, "weight": 1.0}],
-                "cfg_scale": 10,
-                "seed": 0,
-                "steps": 30,
-                "width": width,
-                "height": height,
-            }
-
-            response = self.bedrock_client.invoke_model(
-                modelId="stability.stable-diffusion-xl-base-v1-0", body=json.dumps(body)
+            response = bedrock_scheduler.invoke_model(
+                self.bedrock_client, provider.model_id, json.dumps(body), priority
             )
 
             response_body = json.loads(response["body"].read())
-            return response_body["artifacts"][0]["base64"]
+            return provider.parse_response(response_body)
 
         except Exception as e:
-            logger.error(f"Error generating image with SDXL: {e}")
+            logger.error(f"Error generating image with {provider.name}: {e}")
             raise
 
+    @traced("image_service.generate_with_flux_kontext")
     async def generate_with_flux_kontext(
         self,
         prompt: str,
@@ -181,6 +121,7 @@ class ImageGenerationService:
         seed: Optional[int] = None,
         safety_tolerance: int = 2,
         output_format: str = "jpeg",
+        job: Optional[Job] = None,
     ) -> Dict[str, Any]:
         """
         Generate image using FLUX.1 Kontext for image editing
@@ -192,6 +133,7 @@ class ImageGenerationService:
             seed: Seed for reproducibility
             safety_tolerance: Moderation level (0-2)
             output_format: Output format ("jpeg" or "png")
+            job: Optional job that receives polling state transitions
 
         Returns:
             Dict containing the generated image data
@@ -199,6 +141,11 @@ class ImageGenerationService:
         if not self.flux_api_key:
             raise ValueError("FLUX API key not configured")
 
+        import requests
+
+        started_at = time.perf_counter()
+        attempt = 0
+        outcome = "error"
         try:
             # Create request payload
             payload = {
@@ -244,7 +191,6 @@ class ImageGenerationService:
 
             # Poll for result
             max_attempts = 60  # 30 seconds with 0.5s intervals
-            attempt = 0
 
             while attempt < max_attempts:
                 time.sleep(0.5)
@@ -264,6 +210,11 @@ class ImageGenerationService:
                 status = poll_result.get("status")
 
                 logger.info(f"FLUX generation status: {status} (attempt {attempt})")
+                if job:
+                    job.emit(
+                        "progress",
+                        {"flux_status": status, "attempt": attempt, "request_id": request_id},
+                    )
 
                 if status == "Ready":
                     sample_url = poll_result.get("result", {}).get("sample")
@@ -274,6 +225,7 @@ class ImageGenerationService:
                             image_base64 = base64.b64encode(
                                 img_response.content
                             ).decode("utf-8")
+                            outcome = "ready"
                             return {
                                 "success": True,
                                 "image": f"data:image/{output_format};base64,{image_base64}",
@@ -290,14 +242,18 @@ class ImageGenerationService:
 
                 # Stop early if FLUX has actively moderated the request so the frontend can respond immediately
                 elif status == "Request Moderated":
-                    raise Exception(
-                        "FLUX has moderated this request. Please adjust your prompt or input image to comply with safety guidelines."
-                    )
+                    message = "FLUX has moderated this request. Please adjust your prompt or input image to comply with safety guidelines."
+                    outcome = "moderated"
+                    if job:
+                        job.finish(JOB_MODERATED, error=message)
+                    raise Exception(message)
 
                 elif status in ["Error", "Failed"]:
                     error_msg = poll_result.get("error", "Generation failed")
+                    outcome = "failed"
                     raise Exception(f"FLUX generation failed: {error_msg}")
 
+            outcome = "timeout"
             raise Exception("FLUX generation timed out")
 
         except requests.exceptions.RequestException as e:
@@ -306,23 +262,209 @@ class ImageGenerationService:
         except Exception as e:
             logger.error(f"FLUX generation error: {e}")
             raise
+        finally:
+            set_attributes(**{"flux.outcome": outcome, "flux.poll_attempts": attempt})
+            FLUX_JOB_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - started_at)
+            FLUX_POLL_ATTEMPTS.labels(outcome=outcome).observe(attempt)
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        """Return the circuit breaker for an image model, creating it on first use"""
+        with self._breakers_lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(
+                    model,
+                    window_seconds=float(os.getenv("IMAGE_BREAKER_WINDOW_SECONDS", "60")),
+                    min_calls=int(os.getenv("IMAGE_BREAKER_MIN_CALLS", "5")),
+                    failure_threshold=float(
+                        os.getenv("IMAGE_BREAKER_FAILURE_THRESHOLD", "0.5")
+                    ),
+                    slow_call_seconds=float(os.getenv("IMAGE_BREAKER_SLOW_SECONDS", "30")),
+                    open_seconds=float(os.getenv("IMAGE_BREAKER_OPEN_SECONDS", "30")),
+                )
+            return self._breakers[model]
+
+    def get_breaker_states(self) -> Dict[str, Dict[str, Any]]:
+        """Return circuit breaker state for every image model; "unused" until first called"""
+        with self._breakers_lock:
+            breakers = dict(self._breakers)
+        return {
+            model: (
+                breakers[model].snapshot()
+                if model in breakers
+                else {
+                    "state": "unused",
+                    "calls": 0,
+                    "failure_rate": 0.0,
+                    "p50_latency": None,
+                    "max_latency": None,
+                }
+            )
+            for model in IMAGE_PROVIDERS
+        }
+
+    def _lookup_cache(
+        self, provider: ImageProvider, body: Dict[str, Any]
+    ) -> Tuple[str, Optional[str]]:
+        """Return the result cache key for a request body and the cached image, if any"""
+        cache_key = self.result_cache.key(provider.model_id, body)
+        cached = self.result_cache.get(cache_key)
+        set_attributes(**{"image.cached": bool(cached)})
+        return cache_key, cached
+
+    def _cached_result(
+        self, prompt: str, model: str, width: int, height: int, seed: Optional[int]
+    ) -> Optional[Dict[str, Any]]:
+        """Return the cached result of a deterministic request, or None"""
+        if seed is None or not self.result_cache.enabled:
+            return None
+        provider = get_provider(model)
+        self._validate_request(provider, width, height)
+        _, cached = self._lookup_cache(
+            provider, provider.build_request(prompt, width, height, 1, seed)
+        )
+        if not cached:
+            return None
+        return {"image": cached, "model": model, "seed": seed, "cached": True}
+
+    @traced("image_service.generate_with_breaker")
+    def _generate_with_breaker(
+        self,
+        prompt: str,
+        model: str,
+        width: int,
+        height: int,
+        priority: int,
+        seed: Optional[int],
+    ) -> Dict[str, Any]:
+        """
+        Run a model's provider, failing fast while its breaker is open
+
+        Requests with a fixed seed are deterministic, so they are served from the
+        result cache when possible; seed=None picks a random seed and bypasses it.
+        """
+        provider = get_provider(model)
+        set_attributes(
+            **{"image.model": model, "image.width": width, "image.height": height}
+        )
+        # Invalid requests must not count against the model's health
+        self._validate_request(provider, width, height)
+
+        use_cache = seed is not None
+        if seed is None:
+            seed = random.randint(0, provider.max_seed)
+        body = provider.build_request(prompt, width, height, 1, seed)
+
+        cache_key = None
+        if use_cache and self.result_cache.enabled:
+            cache_key, cached = self._lookup_cache(provider, body)
+            if cached:
+                return {"image": cached, "model": model, "seed": seed, "cached": True}
+
+        breaker = self._breaker(model)
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Model {model} is temporarily unavailable")
+
+        started = time.monotonic()
+        succeeded = False
+        try:
+            images = self._invoke_provider(provider, body, priority)
+            succeeded = True
+        finally:
+            breaker.record(succeeded, time.monotonic() - started)
+
+        if cache_key:
+            self.result_cache.put(cache_key, images[0])
+        return {"image": images[0], "model": model, "seed": seed, "cached": False}
+
+    @traced("image_service.generate_image_routed")
+    def generate_image_routed(
+        self,
+        prompt: str,
+        model: str,
+        width: int = 1024,
+        height: int = 1024,
+        priority: int = PRIORITY_INTERACTIVE,
+        allow_fallback: Optional[bool] = None,
+        seed: Optional[int] = 0,
+        user: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Generate image, falling back to an equivalent model when routing is enabled
+
+        Requests made on behalf of a user wait for their fair share of
+        generation slots in generation_scheduler; cache hits are served without
+        taking one. Returns a dict with the
+        image, the model that actually produced it, the seed used and whether
+        it came from the result cache.
+        """
+        if allow_fallback is None:
+            allow_fallback = self.fallback_routing
+
+        if user is None:
+            return self._generate_with_fallback(
+                prompt, model, width, height, priority, allow_fallback, seed
+            )
+        cached = self._cached_result(prompt, model, width, height, seed)
+        if cached:
+            return cached
+        set_attributes(**{"generation.tier": generation_scheduler.tier(user)})
+        with generation_scheduler.slot(user, generation_cost(width, height)):
+            return self._generate_with_fallback(
+                prompt, model, width, height, priority, allow_fallback, seed
+            )
+
+    def _generate_with_fallback(
+        self,
+        prompt: str,
+        model: str,
+        width: int,
+        height: int,
+        priority: int,
+        allow_fallback: bool,
+        seed: Optional[int],
+    ) -> Dict[str, Any]:
+        try:
+            return self._generate_with_breaker(
+                prompt, model, width, height, priority, seed
+            )
+        except ValueError:
+            raise
+        except Exception as e:
+            fallback = get_provider(model).fallback
+            if not allow_fallback or not fallback:
+                raise
+            fallback_provider = get_provider(fallback)
+            # A request the fallback would reject must not mask the original error
+            # or count against the fallback's breaker
+            if not fallback_provider.supports_size(width, height) or (
+                seed is not None and seed > fallback_provider.max_seed
+            ):
+                logger.warning(
+                    f"Image model {model} failed ({e}); {fallback} does not accept "
+                    f"{width}x{height} with seed {seed}, not falling back"
+                )
+                raise
+            logger.warning(f"Image model {model} failed ({e}), falling back to {fallback}")
+
+        set_attributes(**{"image.fallback": fallback})
+        fallback_prompt = fit_prompt(prompt, prompt_limit(fallback))
+        return self._generate_with_breaker(
+            fallback_prompt, fallback, width, height, priority, seed
+        )
 
     def generate_image(
-        self, prompt: str, model: str, width: int = 1024, height: int = 1024
+        self,
+        prompt: str,
+        model: str,
+        width: int = 1024,
+        height: int = 1024,
+        priority: int = PRIORITY_INTERACTIVE,
+        seed: Optional[int] = 0,
     ) -> str:
         """Generate image using the specified model"""
-        model_generators = {
-            "titan-g1": self.generate_with_titan_g1,
-            "titan-g2": self.generate_with_titan_g2,
-            "nova-canvas": self.generate_with_nova_canvas,
-            "sdxl": self.generate_with_sdxl,
-        }
-
-        generator = model_generators.get(model)
-        if not generator:
-            raise ValueError(f"Unsupported model: {model}")
-
-        return generator(prompt, width, height)
+        return self.generate_image_routed(
+            prompt, model, width, height, priority, seed=seed
+        )["image"]
 
 
 # Global instance
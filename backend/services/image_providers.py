@@ -0,0 +1,235 @@
+import dataclasses
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Size = Tuple[int, int]
+
+TITAN_SIZES = (
+    (1024, 1024), (768, 768), (512, 512), (320, 320),
+    (768, 1152), (384, 576), (1152, 768), (576, 384),
+    (768, 1280), (384, 640), (1280, 768), (640, 384),
+    (896, 1152), (448, 576), (1152, 896), (576, 448),
+    (768, 1408), (384, 704), (1408, 768), (704, 384),
+    (640, 1408), (320, 704), (1408, 640), (704, 320),
+    (1152, 640), (1173, 640),
+)
+SDXL_SIZES = (
+    (1024, 1024), (1152, 896), (1216, 832), (1344, 768), (1536, 640),
+    (640, 1536), (768, 1344), (832, 1216), (896, 1152),
+)
+
+
+@dataclass(frozen=True)
+class ImageProvider:
+    """Everything the generator, prompt fitter and /api/models need to know about a model"""
+
+    id: str
+    name: str
+    description: str
+    model_id: str
+    build_request: Callable[[str, int, int, int, int], Dict[str, Any]]
+    parse_response: Callable[[Dict[str, Any]], List[str]]
+    prompt_limit: int
+    supported_sizes: Optional[Tuple[Size, ...]] = None  # None means any size in bounds
+    min_side: int = 320
+    max_side: int = 4096
+    size_step: int = 16
+    max_pixels: Optional[int] = None
+    # Longest side over shortest side, e.g. 4.0 allows 1:4 through 4:1
+    max_aspect_ratio: Optional[float] = None
+    max_batch_size: int = 1
+    max_concurrency: int = 4
+    max_seed: int = 2147483646
+    fallback: Optional[str] = None
+    # Whether a draft of the raw prompt may be generated while enhancement runs
+    allow_speculative: bool = True
+    # Smallest square size, used for fast preview generations
+    preview_size: Size = (320, 320)
+
+    def supports_size(self, width: int, height: int) -> bool:
+        """Whether the model accepts width x height"""
+        if self.supported_sizes is not None:
+            return (width, height) in self.supported_sizes
+        return (
+            self.min_side <= width <= self.max_side
+            and self.min_side <= height <= self.max_side
+            and width % self.size_step == 0
+            and height % self.size_step == 0
+            and (self.max_pixels is None or width * height <= self.max_pixels)
+            and (
+                self.max_aspect_ratio is None
+                or max(width, height) <= self.max_aspect_ratio * min(width, height)
+            )
+        )
+
+    def preview_dimensions(self, width: int, height: int) -> Size:
+        """Smallest supported size with the same aspect ratio as width x height"""
+        if self.supported_sizes is not None:
+            matching = [
+                (w, h) for w, h in self.supported_sizes if w * height == h * width
+            ]
+            if matching:
+                return min(matching, key=lambda size: size[0] * size[1])
+            return self.preview_size
+
+        scale = self.min_side / min(width, height)
+        if scale >= 1:
+            return width, height
+        preview_width = max(self.min_side, round(width * scale / self.size_step) * self.size_step)
+        preview_height = max(self.min_side, round(height * scale / self.size_step) * self.size_step)
+        if not self.supports_size(preview_width, preview_height):
+            # Rounding pushed a ratio at the limit past it
+            return width, height
+        return preview_width, preview_height
+
+    def describe(self) -> Dict[str, Any]:
+        """Public description used by /api/models"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "prompt_limit": self.prompt_limit,
+            "supported_sizes": (
+                [f"{w}x{h}" for w, h in self.supported_sizes]
+                if self.supported_sizes is not None
+                else None
+            ),
+            "max_pixels": self.max_pixels,
+            "max_aspect_ratio": self.max_aspect_ratio,
+            "max_batch_size": self.max_batch_size,
+            "preview_size": f"{self.preview_size[0]}x{self.preview_size[1]}",
+        }
+
+
+def _titan_request(
+    prompt: str, width: int, height: int, count: int, seed: int
+) -> Dict[str, Any]:
+    # Nova Canvas takes the same TEXT_IMAGE body as Titan
+    return {
+        "taskType": "TEXT_IMAGE",
+        "textToImageParams": {"text": prompt},
+        "imageGenerationConfig": {
+            "numberOfImages": count,
+            "width": width,
+            "height": height,
+            "cfgScale": 8.0,
+            "seed": seed,
+        },
+    }
+
+
+def _sdxl_request(
+    prompt: str, width: int, height: int, count: int, seed: int
+) -> Dict[str, Any]:
+    return {
+        "text_prompts": [{"text": prompt, "weight": 1.0}],
+        "cfg_scale": 10,
+        "seed": seed,
+        "steps": 30,
+        "width": width,
+        "height": height,
+    }
+
+
+def _images_response(body: Dict[str, Any]) -> List[str]:
+    return body["images"]
+
+
+def _artifacts_response(body: Dict[str, Any]) -> List[str]:
+    return [artifact["base64"] for artifact in body["artifacts"]]
+
+
+IMAGE_PROVIDERS: Dict[str, ImageProvider] = {
+    provider.id: provider
+    for provider in (
+        ImageProvider(
+            id="titan-g1",
+            name="Titan Image Generator G1",
+            description="Amazon's Titan Image Generator G1",
+            model_id="amazon.titan-image-generator-v1",
+            build_request=_titan_request,
+            parse_response=_images_response,
+            prompt_limit=512,
+            supported_sizes=TITAN_SIZES,
+            max_batch_size=5,
+            max_concurrency=4,
+            fallback="titan-g2",
+        ),
+        ImageProvider(
+            id="titan-g2",
+            name="Titan Image Generator G1 v2",
+            description="Amazon's Titan Image Generator G1 v2",
+            model_id="amazon.titan-image-generator-v2:0",
+            build_request=_titan_request,
+            parse_response=_images_response,
+            prompt_limit=512,
+            supported_sizes=TITAN_SIZES,
+            max_batch_size=5,
+            max_concurrency=4,
+            fallback="nova-canvas",
+        ),
+        ImageProvider(
+            id="nova-canvas",
+            name="Nova Canvas",
+            description="Amazon's Nova Canvas image model",
+            model_id="amazon.nova-canvas-v1:0",
+            build_request=_titan_request,
+            parse_response=_images_response,
+            prompt_limit=1000,
+            max_batch_size=5,
+            max_concurrency=4,
+            max_seed=858993459,
+            max_pixels=4194304,
+            max_aspect_ratio=4.0,
+            fallback="titan-g2",
+        ),
+        ImageProvider(
+            id="sdxl",
+            name="SDXL 1.0",
+            description="Stability AI's SDXL 1.0 model",
+            model_id="stability.stable-diffusion-xl-base-v1-0",
+            build_request=_sdxl_request,
+            parse_response=_artifacts_response,
+            prompt_limit=1000,
+            supported_sizes=SDXL_SIZES,
+            max_batch_size=1,
+            max_concurrency=2,
+            max_seed=4294967295,
+            fallback="nova-canvas",
+            allow_speculative=False,
+            # SDXL on Bedrock has no size below 1024x1024
+            preview_size=(1024, 1024),
+        ),
+    )
+}
+
+
+def _apply_overrides():
+    """Apply IMAGE_PROVIDER_OVERRIDES, e.g. '{"sdxl": {"max_concurrency": 4}}'"""
+    overrides = os.getenv("IMAGE_PROVIDER_OVERRIDES")
+    if not overrides:
+        return
+    try:
+        for provider_id, fields in json.loads(overrides).items():
+            if provider_id in IMAGE_PROVIDERS:
+                IMAGE_PROVIDERS[provider_id] = dataclasses.replace(
+                    IMAGE_PROVIDERS[provider_id], **fields
+                )
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.error(f"Invalid IMAGE_PROVIDER_OVERRIDES: {e}")
+
+
+_apply_overrides()
+
+
+def get_provider(provider_id: str) -> ImageProvider:
+    """Look up an image provider, raising ValueError for unknown models"""
+    provider = IMAGE_PROVIDERS.get(provider_id)
+    if not provider:
+        raise ValueError(f"Unsupported model: {provider_id}")
+    return provider
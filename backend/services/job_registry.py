@@ -0,0 +1,163 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .metrics import JOBS_ACTIVE
+from .tracing import TracedThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_PENDING = "pending"
+JOB_READY = "ready"
+JOB_MODERATED = "moderated"
+JOB_FAILED = "failed"
+TERMINAL_STATES = {JOB_READY, JOB_MODERATED, JOB_FAILED}
+
+
+class Job:
+    """In-process state and event log of a long-running generation job"""
+
+    def __init__(self, kind: str):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.state = JOB_QUEUED
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        JOBS_ACTIVE.labels(kind=kind).inc()
+        self.emit("state", {"state": JOB_QUEUED})
+
+    @property
+    def finished(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+    def emit(self, event_type: str, data: Optional[Dict[str, Any]] = None):
+        """Append an event and wake up any stream waiting on this job"""
+        with self._cond:
+            self.events.append(
+                {"id": len(self.events) + 1, "type": event_type, "data": data or {}}
+            )
+            self.updated_at = time.time()
+            self._cond.notify_all()
+
+    def set_state(self, state: str, **data):
+        """Record a state transition; repeated states are not re-emitted"""
+        with self._cond:
+            if state == self.state:
+                return
+            if state in TERMINAL_STATES and not self.finished:
+                JOBS_ACTIVE.labels(kind=self.kind).dec()
+            self.state = state
+        self.emit("state", dict(data, state=state))
+
+    def finish(self, state: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        """Move the job to a terminal state with its result or error"""
+        with self._cond:
+            self.result = result
+            self.error = error
+        if error:
+            self.set_state(state, error=error)
+        else:
+            self.set_state(state)
+
+    def wait_for_events(self, after: int, timeout: float) -> List[Dict[str, Any]]:
+        """Return events with id > after, waiting up to timeout for new ones"""
+        with self._cond:
+            if len(self.events) <= after and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[after:]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the job's current state without the event log"""
+        with self._cond:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "state": self.state,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+                "result": self.result,
+                "error": self.error,
+                "event_count": len(self.events),
+            }
+
+
+class JobRegistry:
+    """Tracks jobs in this process and runs them on a bounded thread pool"""
+
+    def __init__(self, max_workers: int = 8, ttl_seconds: float = 3600.0):
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._executor = TracedThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="jobs"
+        )
+
+    def create(self, kind: str) -> Job:
+        """Register a new queued job, dropping expired finished ones"""
+        job = Job(kind)
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id
+                for job_id, existing in self._jobs.items()
+                if existing.finished and now - existing.updated_at > self.ttl_seconds
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def run(self, job: Job, fn: Callable[[Job], Dict[str, Any]]):
+        """Run fn(job) in the background; its return value becomes the job result"""
+
+        def runner():
+            try:
+                job.set_state(JOB_PENDING)
+                result = fn(job)
+                if not job.finished:
+                    job.finish(JOB_READY, result=result)
+            except Exception as e:
+                logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+                if not job.finished:
+                    job.finish(JOB_FAILED, error=str(e))
+
+        self._executor.submit(runner)
+
+    def stream(self, job: Job, after: int = 0, heartbeat: float = 15.0) -> Iterator[Dict]:
+        """Yield job events from id > after until the job finishes; None is a heartbeat"""
+        while True:
+            events = job.wait_for_events(after, heartbeat)
+            if not events:
+                yield None
+            for event in events:
+                after = event["id"]
+                yield event
+            if job.finished and after >= len(job.events):
+                return
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "jobs": len(jobs),
+            "active": sum(1 for job in jobs if not job.finished),
+        }
+
+
+# Global instance
+job_registry = JobRegistry(
+    max_workers=int(os.getenv("JOB_WORKERS", "8")),
+    ttl_seconds=float(os.getenv("JOB_TTL_SECONDS", "3600")),
+)
@@ -1,35 +1,62 @@
 import logging
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Dict, Optional
 from .bedrock_service import bedrock_service
+from .prompt_cache import PromptCache, normalize_prompt
+from .prompt_fitter import clean_llm_output, max_tokens_for_chars
+from .tracing import TracedThreadPoolExecutor, traced
 
 logger = logging.getLogger(__name__)
 
+TECHNIQUES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "config",
+    "kontext-techniques.txt",
+)
 
-class KontextService:
-    """Service class for optimizing prompts for Flux Kontext image editing"""
+# Used when config/kontext-techniques.txt is missing or lacks a template
+DEFAULT_TEMPLATES = {
+    "Object Modification": "Change [object] to [new state], keep [content to preserve] unchanged",
+    "Style Transfer": "Transform to [specific style], while maintaining [composition/character/other] unchanged",
+    "Background Replacement": "Change the background to [new background], keep the subject in the exact same position and pose",
+    "Text Editing": "Replace '[original text]' with '[new text]', maintain the same font style",
+}
 
-    def __init__(self):
-        self.bedrock = bedrock_service
-
-    def optimize_kontext_prompt(
-        self, user_prompt: str, llm_model: str = "claude"
-    ) -> str:
-        """
-        Optimize user prompt for Flux Kontext using professional techniques
+PRESERVE_CLAUSE = "the same facial features, hairstyle, pose, and background lighting"
+IDENTITY_CLAUSE = "the same facial features, hairstyle, and expression"
 
-        Assumes model is on the left and product is on the right based on user specification.
-        """
+_TEMPLATE_LINE_RE = re.compile(r'^\s*([A-Za-z ]+):\s*"(.+)"\s*$')
+_QUOTED_RE = re.compile(r"['\"“”‘’]([^'\"“”‘’]+)['\"“”‘’]")
+_LEADING_FILLER_RE = re.compile(
+    r"^(please\s+)?("
+    r"(make|have|let)\s+(her|him|them|it|the person|the model)\s+(be\s+|into\s+)?(an?\s+)?"
+    r"|(put|place)\s+(her|him|them|the person|the model)\s+(on|in|at|into)\s+"
+    r"|(change|set)\s+the\s+background\s+to\s+"
+    r"|(turn|convert)\s+(it|her|him|them|the image)\s+(in)?to\s+(an?\s+)?"
+    r")?",
+    re.IGNORECASE,
+)
+_BACKGROUND_RE = re.compile(
+    r"\b(background|backdrop|scene|setting|beach|street|studio|city|outdoors?|indoors?)\b",
+    re.IGNORECASE,
+)
+_STYLE_RE = re.compile(
+    r"\b(style|sketch|painting|painted|watercolou?r|cartoon|anime|illustration|oil|pixel art|comic)\b",
+    re.IGNORECASE,
+)
 
-        optimization_prompt = f"""
-You are an expert at optimizing prompts for Flux Kontext image editing. Your task is to transform the user's basic prompt into a highly specific, professional Kontext instruction.
+# Static Kontext instructions, sent as the system prefix
+KONTEXT_OPTIMIZATION_SYSTEM = """You are an expert at optimizing prompts for Flux Kontext image editing. Your task is to transform the user's basic prompt into a highly specific, professional Kontext instruction.
 
 IMPORTANT CONTEXT:
 - The image layout is: Model/Person on LEFT, Product on RIGHT
 - This is for AI influencer product placement scenarios
 - Follow Kontext best practices for precise editing
 
-Original user prompt: "{user_prompt}"
-
-Transform this prompt using these Kontext techniques:
+Transform the user's prompt using these Kontext techniques:
 
 1. BE SPECIFIC AND CLEAR
    - Use precise descriptions instead of vague terms
@@ -67,20 +94,196 @@ Create an optimized Kontext prompt that is:
 - Uses proper Kontext language
 - Under 400 characters for efficiency
 
+Return only the optimized prompt."""
+
+# Kontext instructions are asked to stay under 400 characters
+KONTEXT_MAX_TOKENS = max_tokens_for_chars(400)
+
+# Shared pool so calls that overrun their budget can finish and populate the cache
+_llm_executor = TracedThreadPoolExecutor(
+    max_workers=int(os.getenv("KONTEXT_LLM_WORKERS", "8")),
+    thread_name_prefix="kontext-llm",
+)
+
+
+def load_kontext_templates(path: str = TECHNIQUES_PATH) -> Dict[str, str]:
+    """Load the best practice templates from the Kontext techniques guide"""
+    templates = dict(DEFAULT_TEMPLATES)
+    try:
+        with open(path, encoding="utf-8") as f:
+            in_templates = False
+            for line in f:
+                if line.strip().startswith("Best Practice Templates"):
+                    in_templates = True
+                    continue
+                if not in_templates:
+                    continue
+                match = _TEMPLATE_LINE_RE.match(line)
+                if match:
+                    templates[match.group(1).strip()] = match.group(2).strip()
+    except OSError as e:
+        logger.warning(f"Could not read Kontext techniques from {path}: {e}")
+    return templates
+
+
+def _fill(template: str, values: Dict[str, str]) -> str:
+    """Substitute [placeholder] slots in a template"""
+    return re.sub(r"\[([^\]]+)\]", lambda m: values.get(m.group(1), m.group(0)), template)
+
+
+class KontextService:
+    """Service class for optimizing prompts for Flux Kontext image editing"""
+
+    def __init__(self):
+        self.bedrock = bedrock_service
+        self.templates = load_kontext_templates()
+        self.cache = PromptCache(
+            max_entries=int(os.getenv("KONTEXT_CACHE_MAX_ENTRIES", "512")),
+            ttl_seconds=float(os.getenv("KONTEXT_CACHE_TTL_SECONDS", "3600")),
+            name="kontext_prompt",
+        )
+        self.deadline_seconds = float(os.getenv("KONTEXT_LLM_DEADLINE_SECONDS", "4"))
+        self.hedge_with_titan = os.getenv("KONTEXT_HEDGE_TITAN", "false").lower() == "true"
+
+    def build_template_prompt(self, user_prompt: str) -> str:
+        """
+        Build a Kontext instruction from the best practice templates without an LLM
+
+        Picks the template matching the edit intent (text, background, style or
+        product placement on the person on the left) and fills it from the prompt.
+        """
+        instruction = _LEADING_FILLER_RE.sub("", user_prompt.strip()).rstrip(" .!")
+        if not instruction:
+            instruction = "wear the product from the right"
+
+        quoted = _QUOTED_RE.findall(user_prompt)
+        if len(quoted) >= 2 and re.search(r"\b(replace|text|word)\b", user_prompt, re.I):
+            return _fill(
+                self.templates["Text Editing"],
+                {"original text": quoted[0], "new text": quoted[1]},
+            )
+
+        if _BACKGROUND_RE.search(instruction):
+            return _fill(
+                self.templates["Background Replacement"],
+                {"new background": instruction[0].lower() + instruction[1:]},
+            ) + f", while maintaining {IDENTITY_CLAUSE}"
+
+        if _STYLE_RE.search(instruction):
+            return _fill(
+                self.templates["Style Transfer"],
+                {
+                    "specific style": instruction[0].lower() + instruction[1:],
+                    "composition/character/other": "the composition, the person on the left and their facial features",
+                },
+            )
+
+        new_state = instruction[0].lower() + instruction[1:]
+        if not re.search(r"\b(right|product)\b", new_state, re.IGNORECASE):
+            new_state += " from the right"
+        return _fill(
+            self.templates["Object Modification"],
+            {
+                "object": "the person on the left",
+                "new state": new_state,
+                "content to preserve": PRESERVE_CLAUSE,
+            },
+        )
+
+    @traced("kontext_service.optimize_kontext_prompt")
+    def optimize_kontext_prompt(
+        self,
+        user_prompt: str,
+        llm_model: str = "claude",
+        use_llm: bool = True,
+        deadline_seconds: Optional[float] = None,
+    ) -> str:
+        """
+        Optimize user prompt for Flux Kontext using professional techniques
+
+        Assumes model is on the left and product is on the right based on user specification.
+        Results are cached per (LLM model, normalized prompt); with use_llm=False a cached
+        LLM result or the template fast path is returned without calling Bedrock.
+
+        The LLM call is bounded by a latency budget (KONTEXT_LLM_DEADLINE_SECONDS unless
+        deadline_seconds is given). When it expires the template prompt is returned and
+        the slow call keeps running in the background so its result lands in the cache.
+        """
+        cache_key = (llm_model, normalize_prompt(user_prompt))
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logger.info("Kontext prompt cache hit")
+            return cached
+
+        if not use_llm:
+            return self.build_template_prompt(user_prompt)
+
+        optimization_prompt = f"""Original user prompt: "{user_prompt}"
+
 Optimized prompt:"""
 
-        try:
-            # Use selected LLM model
-            if llm_model == "titan":
-                return self.bedrock.invoke_titan_text(
-                    optimization_prompt, max_tokens=300
-                )
-            else:
-                return self.bedrock.invoke_claude(optimization_prompt, max_tokens=300)
-        except Exception as e:
-            logger.error(f"Error optimizing Kontext prompt: {e}")
-            # Fallback: return original prompt with basic Kontext structure
-            return f"Change the person on the left to {user_prompt}, while maintaining the same facial features, pose, and background"
+        primary = _llm_executor.submit(
+            self._invoke_llm, llm_model, optimization_prompt
+        )
+        primary.add_done_callback(self._cache_result(cache_key))
+        futures = {primary}
+
+        # Race a Titan call alongside Claude so a slow Claude doesn't cost the budget
+        if self.hedge_with_titan and llm_model != "titan":
+            hedge = _llm_executor.submit(self._invoke_llm, "titan", optimization_prompt)
+            hedge.add_done_callback(self._cache_result(("titan", cache_key[1])))
+            futures.add(hedge)
+
+        budget = self.deadline_seconds if deadline_seconds is None else deadline_seconds
+        deadline = time.monotonic() + budget
+        pending = futures
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and future.result():
+                    return future.result()
+                if future.exception() is not None:
+                    logger.error(f"Error optimizing Kontext prompt: {future.exception()}")
+
+        if pending:
+            logger.warning(
+                f"Kontext prompt optimization exceeded {budget:.1f}s budget, "
+                "using template prompt while the LLM call finishes in the background"
+            )
+
+        # Fallback: rule-based prompt from the Kontext best practice templates
+        return self.build_template_prompt(user_prompt)
+
+    @traced("kontext_service.invoke_llm")
+    def _invoke_llm(self, llm_model: str, optimization_prompt: str) -> str:
+        """Run the optimization prompt through the selected LLM"""
+        if llm_model == "titan":
+            optimized = self.bedrock.invoke_titan_text(
+                optimization_prompt,
+                max_tokens=KONTEXT_MAX_TOKENS,
+                system=KONTEXT_OPTIMIZATION_SYSTEM,
+            )
+        else:
+            optimized = self.bedrock.invoke_claude(
+                optimization_prompt,
+                max_tokens=KONTEXT_MAX_TOKENS,
+                system=KONTEXT_OPTIMIZATION_SYSTEM,
+            )
+        return clean_llm_output(optimized)
+
+    def _cache_result(self, cache_key: tuple):
+        """Build a done-callback that caches a successful LLM result, even a late one"""
+
+        def callback(future: Future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            if future.result():
+                self.cache.set(cache_key, future.result())
+
+        return callback
 
 
 # Global instance
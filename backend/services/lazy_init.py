@@ -0,0 +1,64 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class InitRetry:
+    """
+    Lock and retry schedule for a service's lazy client initialization
+
+    The owning service checks its own initialized flag, then takes lock and
+    checks again, so concurrent first requests build the client once. A
+    failed attempt schedules the next one with jittered exponential backoff;
+    until then callers see the service as unavailable instead of retrying on
+    every request.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+    ):
+        self.name = name
+        self.base_delay = (
+            base_delay
+            if base_delay is not None
+            else float(os.getenv("SERVICE_INIT_RETRY_BASE_SECONDS", "1"))
+        )
+        self.max_delay = (
+            max_delay
+            if max_delay is not None
+            else float(os.getenv("SERVICE_INIT_RETRY_MAX_SECONDS", "60"))
+        )
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.last_error = None
+        self._retry_at = 0.0
+
+    def ready(self) -> bool:
+        """Whether the backoff after the last failure has elapsed"""
+        return time.monotonic() >= self._retry_at
+
+    def succeeded(self):
+        self.failures = 0
+        self.last_error = None
+        self._retry_at = 0.0
+
+    def failed(self, error: Exception) -> float:
+        """Record a failed attempt and return the seconds until the next one"""
+        self.failures += 1
+        self.last_error = str(error)
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.failures - 1))
+        delay *= random.uniform(0.5, 1.0)
+        self._retry_at = time.monotonic() + delay
+        logger.warning(
+            f"{self.name} initialization failed (attempt {self.failures}), "
+            f"retrying in {delay:.1f}s: {error}"
+        )
+        return delay
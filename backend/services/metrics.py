@@ -0,0 +1,204 @@
+import os
+import time
+from typing import Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Image generation and FLUX jobs take tens of seconds, well past the default buckets
+LATENCY_BUCKETS = (
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0,
+)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status", ["route", "method", "status"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to produce a response (headers only for streamed responses)",
+    ["route", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+
+BEDROCK_CALLS = Counter(
+    "bedrock_invoke_model_total",
+    "invoke_model attempts by outcome (success, throttled, error)",
+    ["model_id", "outcome"],
+)
+BEDROCK_SECONDS = Histogram(
+    "bedrock_invoke_model_duration_seconds",
+    "invoke_model latency per attempt",
+    ["model_id"],
+    buckets=LATENCY_BUCKETS,
+)
+BEDROCK_QUEUE_SECONDS = Histogram(
+    "bedrock_queue_wait_seconds",
+    "Time spent waiting for a scheduler slot",
+    ["model_id"],
+    buckets=LATENCY_BUCKETS,
+)
+BEDROCK_QUEUE_DEPTH = Gauge(
+    "bedrock_queue_depth",
+    "Requests waiting for a scheduler slot",
+    ["model_id"],
+    multiprocess_mode="livesum",
+)
+BEDROCK_IN_FLIGHT = Gauge(
+    "bedrock_in_flight",
+    "invoke_model calls in flight",
+    ["model_id"],
+    multiprocess_mode="livesum",
+)
+GENERATION_QUEUE_SECONDS = Histogram(
+    "generation_queue_wait_seconds",
+    "Time image generations wait in the fair-share queue",
+    ["tier"],
+    buckets=LATENCY_BUCKETS,
+)
+GENERATION_QUEUE_DEPTH = Gauge(
+    "generation_queue_depth",
+    "Image generations waiting in the fair-share queue",
+    ["tier"],
+    multiprocess_mode="livesum",
+)
+GENERATION_IN_FLIGHT = Gauge(
+    "generation_in_flight",
+    "Image generations holding a fair-share slot",
+    multiprocess_mode="livesum",
+)
+GENERATION_REJECTIONS = Counter(
+    "generation_rejections_total",
+    "Image generations refused admission to the queue",
+    ["tier", "reason"],
+)
+BEDROCK_TOKENS = Counter(
+    "bedrock_tokens_total",
+    "Tokens by kind (input, output, cache_read, cache_write)",
+    ["model_id", "kind"],
+)
+
+FLUX_JOB_SECONDS = Histogram(
+    "flux_job_duration_seconds",
+    "FLUX Kontext generation time from submit to result",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+FLUX_POLL_ATTEMPTS = Histogram(
+    "flux_poll_attempts",
+    "Polling requests per FLUX Kontext generation",
+    ["outcome"],
+    buckets=(1, 2, 5, 10, 15, 20, 30, 45, 60),
+)
+
+AWS_CALL_SECONDS = Histogram(
+    "aws_operation_duration_seconds",
+    "S3 and DynamoDB operation latency",
+    ["service", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+AWS_CALL_ERRORS = Counter(
+    "aws_operation_errors_total", "Failed S3 and DynamoDB operations", ["service", "operation"]
+)
+DYNAMODB_CAPACITY = Counter(
+    "dynamodb_consumed_capacity_units_total",
+    "Read and write capacity units consumed",
+    ["table", "operation"],
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by result (hit, miss)", ["cache", "result"]
+)
+
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total",
+    "Requests rejected with 429 by the bucket that ran out (user, global)",
+    ["group", "scope"],
+)
+
+IMAGE_CODEC_PENDING = Gauge(
+    "image_codec_pending",
+    "Image codec operations queued or running",
+    multiprocess_mode="livesum",
+)
+JOBS_ACTIVE = Gauge(
+    "jobs_active", "Background jobs not yet finished", ["kind"], multiprocess_mode="livesum"
+)
+
+# DynamoDB operations that accept ReturnConsumedCapacity
+_CAPACITY_OPERATIONS = {
+    "GetItem", "PutItem", "UpdateItem", "DeleteItem", "Query", "Scan",
+    "BatchGetItem", "BatchWriteItem", "TransactGetItems", "TransactWriteItems",
+}
+
+
+def multiprocess_enabled() -> bool:
+    """Whether metrics are aggregated across gunicorn workers"""
+    return bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Return the exposition payload and its content type"""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def instrument_boto_client(client):
+    """Time every operation of a boto3 client and count DynamoDB consumed capacity"""
+    service = client.meta.service_model.service_name
+    events = client.meta.events
+
+    def before_call(model, context, **kwargs):
+        context["metrics_operation"] = model.name
+        context["metrics_start"] = time.perf_counter()
+
+    def after_call(http_response, parsed, model, context, **kwargs):
+        start = context.get("metrics_start")
+        if start is not None:
+            AWS_CALL_SECONDS.labels(service=service, operation=model.name).observe(
+                time.perf_counter() - start
+            )
+        if http_response.status_code >= 300:
+            AWS_CALL_ERRORS.labels(service=service, operation=model.name).inc()
+        consumed = parsed.get("ConsumedCapacity")
+        if consumed:
+            for entry in consumed if isinstance(consumed, list) else [consumed]:
+                DYNAMODB_CAPACITY.labels(
+                    table=entry.get("TableName", ""), operation=model.name
+                ).inc(entry.get("CapacityUnits", 0))
+
+    def after_call_error(context, **kwargs):
+        # Raised before a response was received, e.g. connection errors
+        operation = context.get("metrics_operation")
+        if operation is None:
+            return
+        AWS_CALL_SECONDS.labels(service=service, operation=operation).observe(
+            time.perf_counter() - context["metrics_start"]
+        )
+        AWS_CALL_ERRORS.labels(service=service, operation=operation).inc()
+
+    def request_capacity(params, model, **kwargs):
+        if model.name in _CAPACITY_OPERATIONS:
+            params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+    events.register("before-call", before_call)
+    events.register("after-call", after_call)
+    events.register("after-call-error", after_call_error)
+    if service == "dynamodb":
+        events.register("provide-client-params.dynamodb", request_capacity)
+    return client
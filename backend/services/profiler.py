@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bound on how long a single request is sampled (e.g. an SSE stream)
+DEFAULT_MAX_SECONDS = 30.0
+
+
+class Profile:
+    """Stack samples collected for one request thread"""
+
+    def __init__(self, thread_id: int, tags: Dict[str, Any], max_seconds: float):
+        self.id = uuid.uuid4().hex[:16]
+        self.thread_id = thread_id
+        self.tags = {k: v for k, v in tags.items() if v is not None}
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + max_seconds
+        self.duration_ms: Optional[float] = None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope"""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "tags": self.tags,
+        }
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    path = code.co_filename.split(os.sep)
+    return f"{name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    # Semicolons separate frames in the collapsed format
+    return ";".join(label.replace(";", ",") for label in reversed(labels))
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for selected request threads
+
+    One daemon thread wakes every interval and records the current stack of
+    each thread with an active profile. Nothing runs while no request is being
+    profiled, so the cost when disabled is a sample-rate check per request.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+        max_seconds: float = DEFAULT_MAX_SECONDS,
+        output_dir: Optional[str] = None,
+        keep: int = 50,
+    ):
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.output_dir = output_dir
+        self._active: Dict[int, Profile] = {}
+        self._finished = deque(maxlen=keep)
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, tags: Dict[str, Any]) -> Profile:
+        """Begin sampling the calling thread"""
+        profile = Profile(threading.get_ident(), tags, self.max_seconds)
+        with self._cond:
+            self._active[profile.thread_id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._sample_loop, name="request-profiler", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+        return profile
+
+    def stop(self, profile: Profile, **tags) -> Profile:
+        """Stop sampling, record the profile and write it out if a directory is set"""
+        with self._cond:
+            self._active.pop(profile.thread_id, None)
+            profile.duration_ms = round((time.time() - profile.started_at) * 1000, 1)
+            profile.tags.update({k: v for k, v in tags.items() if v is not None})
+            self._finished.append(profile)
+        if self.output_dir:
+            self._write(profile)
+        return profile
+
+    def _sample_loop(self):
+        while True:
+            with self._cond:
+                while not self._active:
+                    self._cond.wait()
+                # Sampled under the lock so stop() never sees a profile mid-update
+                frames = sys._current_frames()
+                now = time.monotonic()
+                for profile in self._active.values():
+                    frame = frames.get(profile.thread_id)
+                    if frame is not None and now <= profile.deadline:
+                        profile.stacks[_collapse(frame)] += 1
+                        profile.samples += 1
+                del frames
+            time.sleep(self.interval)
+
+    def _write(self, profile: Profile):
+        route = re.sub(r"[^A-Za-z0-9]+", "_", str(profile.tags.get("route", ""))).strip("_")
+        base = os.path.join(self.output_dir, f"{profile.id}-{route or 'request'}")
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(f"{base}.folded", "w") as f:
+                f.write(profile.collapsed())
+            with open(f"{base}.json", "w") as f:
+                json.dump(profile.metadata(), f)
+        except OSError as e:
+            logger.warning(f"Writing profile {profile.id} to {self.output_dir} failed: {e}")
+            return
+        self._prune()
+
+    def _prune(self):
+        """Keep only the newest profiles in the output directory"""
+        try:
+            entries = sorted(
+                os.scandir(self.output_dir), key=lambda e: e.stat().st_mtime, reverse=True
+            )
+        except OSError:
+            return
+        metadata = [e for e in entries if e.name.endswith(".json")]
+        for entry in metadata[self._finished.maxlen :]:
+            stem = entry.path[: -len(".json")]
+            for path in (entry.path, f"{stem}.folded"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Another worker may have pruned it already
+                    pass
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Most recent first; read from the output directory so all workers are included"""
+        if not self.output_dir:
+            with self._cond:
+                return [p.metadata() for p in reversed(self._finished)]
+
+        profiles = []
+        try:
+            names = [n for n in os.listdir(self.output_dir) if n.endswith(".json")]
+        except OSError:
+            return []
+        for name in names:
+            try:
+                with open(os.path.join(self.output_dir, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda p: p["started_at"], reverse=True)
+
+    def get_collapsed(self, profile_id: str) -> Optional[str]:
+        """Collapsed stacks for a profile id, or None if it is unknown"""
+        if not re.fullmatch(r"[0-9a-f]{16}", profile_id):
+            return None
+        if not self.output_dir:
+            with self._cond:
+                for profile in self._finished:
+                    if profile.id == profile_id:
+                        return profile.collapsed()
+            return None
+
+        try:
+            for name in os.listdir(self.output_dir):
+                if name.startswith(profile_id) and name.endswith(".folded"):
+                    with open(os.path.join(self.output_dir, name)) as f:
+                        return f.read()
+        except OSError:
+            pass
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "sample_rate": self.sample_rate,
+                "interval_ms": self.interval * 1000,
+                "active": len(self._active),
+                "retained": len(self._finished),
+                "output_dir": self.output_dir,
+            }
+
+
+# Global instance
+request_profiler = SamplingProfiler(
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+    max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", str(DEFAULT_MAX_SECONDS))),
+    output_dir=os.getenv("PROFILE_DIR") or None,
+    keep=int(os.getenv("PROFILE_KEEP", "50")),
+)
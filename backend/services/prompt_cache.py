@@ -0,0 +1,73 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from .metrics import record_cache_lookup
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a user prompt so trivially different spellings share a cache entry"""
+    return _WHITESPACE_RE.sub(" ", (prompt or "").strip().lower()).rstrip(" .!")
+
+
+class PromptCache:
+    """Thread-safe in-memory cache with TTL expiry and LRU eviction"""
+
+    def __init__(
+        self, max_entries: int = 512, ttl_seconds: float = 3600.0, name: str = "prompt"
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                record_cache_lookup(self.name, hit=False)
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                record_cache_lookup(self.name, hit=False)
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            record_cache_lookup(self.name, hit=True)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store value under key, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return cache size and hit/miss counters"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
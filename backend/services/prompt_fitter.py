@@ -0,0 +1,121 @@
+import re
+from typing import List
+from .image_providers import IMAGE_PROVIDERS
+
+# Used for unknown models, matching the strictest (Titan) limit
+DEFAULT_PROMPT_LIMIT = 512
+
+# Rough English average for Claude/Titan tokenizers, kept conservative
+CHARS_PER_TOKEN = 3.5
+
+# Phrases that add little to the image once the prompt has to be shortened
+LOW_VALUE_PATTERNS = [
+    r"\b(8k|4k|uhd|hdr|high[- ]res(olution)?|ultra[- ]?(hd|detailed|realistic))\b",
+    r"\b(masterpiece|best quality|high quality|award[- ]winning|trending on \w+)\b",
+    r"\b(highly|extremely|intricately|hyper)[- ]?detailed\b",
+    r"\b(stunning|beautiful|gorgeous|amazing|breathtaking|captivating|striking)\b",
+    r"\b(professional(ly)?|polished|premium|high[- ]end)\b",
+    r"\b(sharp focus|crisp|clean)\b",
+]
+TECHNICAL_PATTERNS = [
+    r"\b\d+\s?mm\b",
+    r"\bf/\d",
+    r"\b(iso|aperture|shutter|lens|bokeh|depth of field|dslr|canon|nikon|sony)\b",
+]
+INTENSIFIERS_RE = re.compile(
+    r"\b(very|extremely|really|incredibly|highly|super|ultra)\s+", re.IGNORECASE
+)
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "with", "in", "on", "at", "of", "for", "to",
+    "her", "his", "their", "its", "is", "by", "from", "as",
+}
+_ARTIFACT_RE = re.compile(r"^\s*(enhanced|optimized)?\s*prompt\s*:\s*", re.IGNORECASE)
+_SPLIT_RE = re.compile(r"(?<=[,;.])\s+")
+
+_LOW_VALUE_RES = [re.compile(p, re.IGNORECASE) for p in LOW_VALUE_PATTERNS]
+_TECHNICAL_RES = [re.compile(p, re.IGNORECASE) for p in TECHNICAL_PATTERNS]
+
+
+def prompt_limit(image_model: str) -> int:
+    """Return the prompt character limit of an image model"""
+    provider = IMAGE_PROVIDERS.get(image_model)
+    return provider.prompt_limit if provider else DEFAULT_PROMPT_LIMIT
+
+
+def max_tokens_for_chars(max_chars: int) -> int:
+    """max_tokens for an LLM call whose output must fit in max_chars"""
+    return int(max_chars / CHARS_PER_TOKEN) + 16
+
+
+def clean_llm_output(text: str) -> str:
+    """Strip the label and quotes LLMs tend to wrap a generated prompt in"""
+    text = _ARTIFACT_RE.sub("", (text or "").strip())
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        text = text[1:-1].strip()
+    return text
+
+
+def _content_words(phrase: str) -> set:
+    return {
+        w for w in re.findall(r"[a-z0-9']+", phrase.lower()) if w not in STOPWORDS
+    }
+
+
+def _value(phrase: str, others: List[str]) -> tuple:
+    """
+    Rank a phrase; lower means drop first
+
+    Phrases adding no content word of their own rank lowest, then quality
+    boilerplate, then camera jargon, then the rest; ties go to the phrase with
+    fewer unique content words.
+    """
+    if any(r.search(phrase) for r in _LOW_VALUE_RES):
+        category = 0
+    elif any(r.search(phrase) for r in _TECHNICAL_RES):
+        category = 1
+    else:
+        category = 2
+
+    words = _content_words(phrase)
+    seen = set()
+    for other in others:
+        seen |= _content_words(other)
+    unique = len(words - seen)
+    return unique > 0, category, unique
+
+
+def _join(phrases: List[str]) -> str:
+    text = " ".join(phrases).strip()
+    return text.rstrip(",;") if text else text
+
+
+def fit_prompt(prompt: str, max_chars: int) -> str:
+    """
+    Fit a prompt into max_chars by removing the least useful phrases
+
+    The first phrase (the subject) is always kept. Redundant phrases go first,
+    then quality boilerplate, then camera jargon; plain tail truncation is
+    only used when the subject alone is too long.
+    """
+    prompt = clean_llm_output(prompt)
+    if len(prompt) <= max_chars:
+        return prompt
+
+    prompt = INTENSIFIERS_RE.sub("", prompt)
+    if len(prompt) <= max_chars:
+        return prompt
+
+    phrases = [p for p in _SPLIT_RE.split(prompt) if p]
+    while len(_join(phrases)) > max_chars and len(phrases) > 1:
+        candidates = range(1, len(phrases))
+        drop = min(
+            candidates,
+            key=lambda i: _value(phrases[i], phrases[:i] + phrases[i + 1 :]) + (-i,),
+        )
+        phrases.pop(drop)
+
+    fitted = _join(phrases)
+    if len(fitted) > max_chars:
+        fitted = fitted[:max_chars].rsplit(" ", 1)[0].rstrip(",;")
+    return fitted
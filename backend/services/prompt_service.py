@@ -1,110 +1,143 @@
 import logging
+import os
+from typing import Optional
 from .bedrock_service import bedrock_service
+from .character_compiler import compile_character_prompt
+from .prompt_cache import PromptCache
+from .prompt_fitter import clean_llm_output, max_tokens_for_chars, prompt_limit
+from .tracing import traced
 
 logger = logging.getLogger(__name__)
 
+# Static instructions are sent as the system prefix; only the user-specific prompt
+# varies between calls. They are too short to reach Bedrock's minimum cacheable
+# prefix, so no cache checkpoint is set for them (see is_cacheable_prefix).
+CONCISE_ENHANCE_SYSTEM = """You enhance prompts for AI image generation.
+
+Make the given prompt more professional by adding 2-3 key visual details like lighting, style, or quality terms. Keep it concise and within the requested length. Return only the enhanced prompt."""
+
+DETAILED_ENHANCE_SYSTEM = """You are an expert AI prompt engineer specializing in creating detailed, professional prompts for AI influencer generation.
+
+Enhance the given basic prompt by adding:
+- Professional photography terms
+- Lighting descriptions (studio lighting, natural light, etc.)
+- Camera settings and angles
+- Style descriptors
+- Quality indicators
+- Composition details
+
+Keep the original intent but make it much more detailed and professional, within the requested length. Put the most important details first. Return only the enhanced prompt, no explanations."""
+
+CHARACTER_PROMPT_SYSTEM = """Polish a draft AI influencer prompt. Use ONLY the details present in the draft and do not invent new ones.
+
+Rewrite it as a SHORT, precise prompt (2-3 sentences max, within the requested length) that combines these elements naturally. Focus on visual impact, not technical details. Return only the prompt."""
+
 
 class PromptService:
     """Service class for prompt enhancement and generation"""
 
     def __init__(self):
         self.bedrock = bedrock_service
+        self.character_cache = PromptCache(
+            max_entries=int(os.getenv("CHARACTER_CACHE_MAX_ENTRIES", "512")),
+            ttl_seconds=float(os.getenv("CHARACTER_CACHE_TTL_SECONDS", "86400")),
+            name="character_prompt",
+        )
 
+    @traced("prompt_service.enhance_prompt")
     def enhance_prompt(
-        self, user_prompt: str, llm_model: str = "claude", image_model: str = "titan-g1"
+        self,
+        user_prompt: str,
+        llm_model: str = "claude",
+        image_model: str = "titan-g1",
+        max_chars: Optional[int] = None,
     ) -> str:
-        """Enhance user prompt with AI suggestions, optimized for image model limits"""
+        """
+        Enhance user prompt with AI suggestions, optimized for image model limits
+
+        The LLM is asked for at most max_chars characters (defaulting to ~90% of
+        the image model's prompt limit) and max_tokens is sized to match.
+        """
+        if max_chars is None:
+            max_chars = int(prompt_limit(image_model) * 0.9)
 
         # Different enhancement strategies based on image model prompt limits
         if image_model in ["titan-g1", "titan-g2"]:
             # Concise enhancement for Titan models (512 char limit)
+            system = CONCISE_ENHANCE_SYSTEM
             enhancement_prompt = f"""Take this prompt: "{user_prompt}"
 
-Make it more professional by adding 2-3 key visual details like lighting, style, or quality terms. Keep it concise and under 400 characters total.
+Keep the enhanced prompt under {max_chars} characters.
 
 Enhanced prompt:"""
         else:
             # More detailed enhancement for models with higher limits
-            enhancement_prompt = f"""You are an expert AI prompt engineer specializing in creating detailed, professional prompts for AI influencer generation. 
+            system = DETAILED_ENHANCE_SYSTEM
+            enhancement_prompt = f"""Take this basic prompt: "{user_prompt}"
 
-Take this basic prompt: "{user_prompt}"
-
-Enhance it by adding:
-- Professional photography terms
-- Lighting descriptions (studio lighting, natural light, etc.)
-- Camera settings and angles
-- Style descriptors
-- Quality indicators
-- Composition details
-
-Keep the original intent but make it much more detailed and professional. Return only the enhanced prompt, no explanations.
+Keep the enhanced prompt under {max_chars} characters.
 
 Enhanced prompt:"""
 
+        max_tokens = max_tokens_for_chars(max_chars)
+
         # Use selected LLM model
         if llm_model == "titan":
-            return self.bedrock.invoke_titan_text(enhancement_prompt, max_tokens=500)
+            enhanced = self.bedrock.invoke_titan_text(
+                enhancement_prompt, max_tokens=max_tokens, system=system
+            )
         else:
-            return self.bedrock.invoke_claude(enhancement_prompt, max_tokens=500)
+            enhanced = self.bedrock.invoke_claude(
+                enhancement_prompt, max_tokens=max_tokens, system=system
+            )
+        return clean_llm_output(enhanced)
 
+    @traced("prompt_service.generate_character_prompt")
     def generate_character_prompt(
-        self, character_features: dict, base_prompt: str = "", llm_model: str = "claude"
+        self,
+        character_features: dict,
+        base_prompt: str = "",
+        llm_model: str = "claude",
+        image_model: str = "titan-g1",
+        refine: bool = False,
     ) -> str:
-        """Generate prompt based on character builder selections"""
-        # Extract character features
-        # Demographics
-        age = character_features.get("age", "")
-        gender = character_features.get("gender", "")
-        ethnicity = character_features.get("ethnicity", "")
-
-        # Physical Features
-        body_type = character_features.get("body_type", "")
-        hair_style = character_features.get("hair_style", "")
-        hair_color = character_features.get("hair_color", "")
-
-        # Personality & Traits
-        expression = character_features.get("expression", "")
-        personality = character_features.get("personality", "")
-        confidence_level = character_features.get("confidence_level", "")
-
-        # Style & Aesthetic
-        fashion_style = character_features.get("fashion_style", "")
-        overall_vibe = character_features.get("overall_vibe", "")
-
-        # Scene & Setting
-        background = character_features.get("background", "")
-        lighting_style = character_features.get("lighting_style", "")
-        photo_type = character_features.get("photo_type", "")
-
-        character_prompt_template = f"""Create a concise, precise AI influencer prompt. Use ONLY the non-empty specifications below:
-
-Base: {base_prompt if base_prompt else 'AI influencer'}
-
-Features to include:
-{f"- {age} {gender}" if age and gender else f"- {age}" if age else f"- {gender}" if gender else ""}
-{f"- {ethnicity}" if ethnicity else ""}
-{f"- {body_type} build" if body_type else ""}
-{f"- {hair_color} {hair_style} hair" if hair_color and hair_style else f"- {hair_style} hair" if hair_style else f"- {hair_color} hair" if hair_color else ""}
-{f"- {expression} expression" if expression else ""}
-{f"- {personality} personality" if personality else ""}
-{f"- {confidence_level} confidence" if confidence_level else ""}
-{f"- {fashion_style} style" if fashion_style else ""}
-{f"- {overall_vibe} vibe" if overall_vibe else ""}
-{f"- {background} background" if background else ""}
-{f"- {lighting_style} lighting" if lighting_style else ""}
-{f"- {photo_type} shot" if photo_type else ""}
-
-Generate a SHORT, precise prompt (2-3 sentences max) that combines these elements naturally. Focus on visual impact, not technical details.
+        """
+        Generate prompt based on character builder selections
+
+        The prompt is compiled locally from the features; with refine=True it is
+        additionally polished by the selected LLM and the result cached.
+        """
+        compiled = compile_character_prompt(character_features, base_prompt, image_model)
+        if not refine:
+            return compiled
+
+        cache_key = (llm_model, image_model, compiled)
+        cached = self.character_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        max_chars = prompt_limit(image_model)
+        refinement_prompt = f"""Draft: "{compiled}"
+
+Keep the prompt under {max_chars} characters.
 
 Prompt:"""
+        max_tokens = max_tokens_for_chars(max_chars)
 
         # Use selected LLM model
         if llm_model == "titan":
-            return self.bedrock.invoke_titan_text(
-                character_prompt_template, max_tokens=800
+            refined = self.bedrock.invoke_titan_text(
+                refinement_prompt, max_tokens=max_tokens, system=CHARACTER_PROMPT_SYSTEM
             )
         else:
-            return self.bedrock.invoke_claude(character_prompt_template, max_tokens=800)
+            refined = self.bedrock.invoke_claude(
+                refinement_prompt, max_tokens=max_tokens, system=CHARACTER_PROMPT_SYSTEM
+            )
+
+        refined = clean_llm_output(refined)
+        if refined:
+            self.character_cache.set(cache_key, refined)
+        return refined or compiled
 
 
 # Global instance
@@ -0,0 +1,254 @@
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .metrics import RATE_LIMIT_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+SCOPE_USER = "user"
+SCOPE_ADDRESS = "address"
+SCOPE_GLOBAL = "global"
+
+# Route groups and their default limits: (per minute, burst) for each scope.
+# The address limit is looser than the user one since users behind one NAT share it.
+DEFAULT_LIMITS: Dict[str, Dict[str, Tuple[float, float]]] = {
+    # Image generation on Bedrock, the scarcest quota
+    "generate": {SCOPE_USER: (10, 5), SCOPE_ADDRESS: (30, 10), SCOPE_GLOBAL: (120, 20)},
+    # Claude and Titan text calls behind the prompt routes
+    "prompt": {SCOPE_USER: (30, 10), SCOPE_ADDRESS: (90, 30), SCOPE_GLOBAL: (300, 50)},
+}
+
+
+@dataclass(frozen=True)
+class Bucket:
+    """A token bucket holding up to burst tokens, refilled at rate tokens per second"""
+
+    key: str
+    scope: str
+    rate: float
+    burst: float
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    retry_after: float = 0.0
+    scope: Optional[str] = None
+
+
+class MemoryBucketStore:
+    """
+    Token buckets in this process's memory
+
+    Limits apply per process, so with several gunicorn workers the effective
+    limit is the configured one times the worker count; set RATE_LIMIT_REDIS_URL
+    to share buckets across workers.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at, time the bucket is full again)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _level(self, bucket: Bucket, now: float) -> float:
+        tokens, updated_at, _ = self._buckets.get(bucket.key, (bucket.burst, now, now))
+        return min(bucket.burst, tokens + (now - updated_at) * bucket.rate)
+
+    def take(self, buckets: Sequence[Bucket], costs: Sequence[float]) -> Tuple[float, int]:
+        """
+        Take costs[i] tokens from every bucket, or from none of them
+
+        Returns (seconds until all buckets hold enough, index of the bucket
+        that takes longest); (0, -1) when the tokens were taken.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = [self._level(bucket, now) for bucket in buckets]
+            wait, limiting = 0.0, -1
+            for i, bucket in enumerate(buckets):
+                if levels[i] < costs[i]:
+                    bucket_wait = (costs[i] - levels[i]) / bucket.rate
+                    if bucket_wait > wait:
+                        wait, limiting = bucket_wait, i
+            if limiting >= 0:
+                return wait, limiting
+            for i, bucket in enumerate(buckets):
+                tokens = levels[i] - costs[i]
+                full_at = now + (bucket.burst - tokens) / bucket.rate
+                self._buckets[bucket.key] = (tokens, now, full_at)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return 0.0, -1
+
+    def _prune(self, now: float):
+        # A bucket that has refilled is the same as a missing one
+        for key, (_, _, full_at) in list(self._buckets.items()):
+            if full_at <= now:
+                del self._buckets[key]
+
+
+# KEYS: bucket keys; ARGV: rate, burst and cost for each key in turn.
+# Uses the server clock so every worker agrees on elapsed time.
+_TAKE_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+local wait, limiting = 0, -1
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[i * 3 - 2])
+  local burst = tonumber(ARGV[i * 3 - 1])
+  local cost = tonumber(ARGV[i * 3])
+  local state = redis.call('HMGET', key, 'tokens', 'updated_at')
+  local tokens = tonumber(state[1]) or burst
+  local updated_at = tonumber(state[2]) or now
+  levels[i] = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+  if levels[i] < cost and (cost - levels[i]) / rate > wait then
+    wait, limiting = (cost - levels[i]) / rate, i - 1
+  end
+end
+if limiting >= 0 then
+  return {tostring(wait), limiting}
+end
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[i * 3 - 2])
+  local burst = tonumber(ARGV[i * 3 - 1])
+  redis.call('HSET', key, 'tokens', tostring(levels[i] - tonumber(ARGV[i * 3])), 'updated_at', tostring(now))
+  redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+end
+return {'0', -1}
+"""
+
+
+class RedisBucketStore:
+    """
+    Token buckets in Redis (or any server speaking its protocol, such as Valkey),
+    shared by every worker
+
+    All buckets of a check are updated in one script call, so concurrent
+    workers cannot overdraw them. When the server is unreachable requests are
+    allowed rather than failed.
+    """
+
+    def __init__(self, url: str, timeout: float = 0.1, key_prefix: str = "ratelimit:"):
+        self.url = url
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self._script = None
+        self._lock = threading.Lock()
+        self._last_error_logged = 0.0
+
+    def _take_script(self):
+        if self._script is None:
+            with self._lock:
+                if self._script is None:
+                    import redis
+
+                    client = redis.Redis.from_url(
+                        self.url,
+                        socket_timeout=self.timeout,
+                        socket_connect_timeout=self.timeout,
+                    )
+                    self._script = client.register_script(_TAKE_SCRIPT)
+        return self._script
+
+    def take(self, buckets: Sequence[Bucket], costs: Sequence[float]) -> Tuple[float, int]:
+        args: List[float] = []
+        for bucket, cost in zip(buckets, costs):
+            args.extend((bucket.rate, bucket.burst, cost))
+        try:
+            wait, limiting = self._take_script()(
+                keys=[self.key_prefix + bucket.key for bucket in buckets], args=args
+            )
+        except Exception as e:
+            now = time.monotonic()
+            if now - self._last_error_logged > 60:
+                self._last_error_logged = now
+                logger.warning(f"Rate limit store unavailable, allowing requests: {e}")
+            return 0.0, -1
+        return float(wait), int(limiting)
+
+
+class RateLimiter:
+    """
+    Per-user, per-address and global token buckets for each route group
+
+    A request is admitted only if its user's bucket, its client address's
+    bucket and the group's global bucket all hold enough tokens, and is then
+    charged to each. User ids are not authenticated, so the address bucket
+    caps a client rotating ids, and the global bucket caps what many clients
+    can send to Bedrock together. Limits come from
+    RATE_LIMIT_<GROUP>_<USER|ADDRESS|GLOBAL>_PER_MINUTE and _BURST; a
+    per-minute value of 0 disables that bucket.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+        self.limits: Dict[str, Dict[str, Tuple[float, float]]] = {}
+        for group, scopes in DEFAULT_LIMITS.items():
+            self.limits[group] = {}
+            for scope, (per_minute, burst) in scopes.items():
+                prefix = f"RATE_LIMIT_{group.upper()}_{scope.upper()}"
+                per_minute = float(os.getenv(f"{prefix}_PER_MINUTE", per_minute))
+                burst = float(os.getenv(f"{prefix}_BURST", burst))
+                if per_minute > 0:
+                    self.limits[group][scope] = (per_minute, max(burst, 1.0))
+
+        redis_url = os.getenv("RATE_LIMIT_REDIS_URL")
+        if redis_url:
+            self.store = RedisBucketStore(
+                redis_url, timeout=float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", "0.1"))
+            )
+        else:
+            self.store = MemoryBucketStore()
+
+    @property
+    def per_process(self) -> bool:
+        """Whether limits are enforced separately by each process"""
+        return self.enabled and isinstance(self.store, MemoryBucketStore)
+
+    def _buckets(self, group: str, user_key: str, address: Optional[str]) -> List[Bucket]:
+        buckets = []
+        for scope, (per_minute, burst) in self.limits.get(group, {}).items():
+            if scope == SCOPE_USER:
+                key = f"{group}:{user_key}"
+            elif scope == SCOPE_ADDRESS:
+                if address is None:
+                    continue
+                key = f"{group}:addr:{address}"
+            else:
+                key = f"{group}:*"
+            buckets.append(Bucket(key, scope, per_minute / 60.0, burst))
+        return buckets
+
+    def check(
+        self, group: str, user_key: str, cost: float = 1.0, address: Optional[str] = None
+    ) -> Decision:
+        """
+        Charge cost tokens to the user's, the address's and the global bucket of group
+
+        A cost above a bucket's burst is charged as a full bucket, so large
+        requests wait for an idle bucket instead of being rejected forever.
+        """
+        if not self.enabled:
+            return Decision(True)
+        buckets = self._buckets(group, user_key, address)
+        if not buckets:
+            return Decision(True)
+        costs = [min(cost, bucket.burst) for bucket in buckets]
+        wait, limiting = self.store.take(buckets, costs)
+        if limiting < 0:
+            return Decision(True)
+        scope = buckets[limiting].scope
+        RATE_LIMIT_REJECTIONS.labels(group=group, scope=scope).inc()
+        return Decision(False, retry_after=math.ceil(wait), scope=scope)
+
+
+# Global instance
+rate_limiter = RateLimiter()
@@ -0,0 +1,215 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+from .lazy_init import InitRetry
+from .metrics import instrument_boto_client, record_cache_lookup
+from .tracing import set_attributes, trace_boto_client, traced
+
+logger = logging.getLogger(__name__)
+
+
+class ImageResultCache:
+    """
+    Content-addressed cache of generated images keyed on the canonical request body
+
+    Images are stored as raw bytes in a size-bounded local directory (least
+    recently used files are evicted first) and optionally mirrored to S3 so
+    other instances can reuse them.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: int = 512 * 1024 * 1024,
+        s3_bucket: Optional[str] = None,
+        s3_prefix: str = "cache/generations/",
+        enabled: bool = True,
+    ):
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), "clonefluencer-image-cache"
+        )
+        self.max_bytes = max_bytes
+        self.s3_bucket = s3_bucket
+        self.s3_prefix = s3_prefix
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._s3_client = None
+        self._total_bytes = None
+        self._lock = threading.Lock()
+        self._s3_init = InitRetry("Image cache S3 client")
+
+    @staticmethod
+    def key(model_id: str, body: Dict[str, Any]) -> str:
+        """Hash the model id and request body into a cache key"""
+        canonical = json.dumps(
+            {"model_id": model_id, "body": body}, sort_keys=True, separators=(",", ":")
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _s3(self):
+        if self._s3_client is None:
+            with self._s3_init.lock:
+                if self._s3_client is None:
+                    if not self._s3_init.ready():
+                        raise RuntimeError(
+                            f"S3 client unavailable: {self._s3_init.last_error}"
+                        )
+                    try:
+                        import boto3
+
+                        client = boto3.session.Session().client(
+                            "s3", region_name=os.getenv("AWS_REGION", "us-east-1")
+                        )
+                    except Exception as e:
+                        self._s3_init.failed(e)
+                        raise
+                    self._s3_client = trace_boto_client(instrument_boto_client(client))
+                    self._s3_init.succeeded()
+        return self._s3_client
+
+    @traced("result_cache.get")
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached image as base64, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used for eviction
+            self.hits += 1
+            record_cache_lookup("image_result", hit=True)
+            set_attributes(**{"cache.hit": "local", "response.size": len(data)})
+            return base64.b64encode(data).decode("utf-8")
+        except OSError:
+            pass
+
+        if self.s3_bucket:
+            try:
+                response = self._s3().get_object(
+                    Bucket=self.s3_bucket, Key=self.s3_prefix + key
+                )
+                data = response["Body"].read()
+                self._write_local(key, data)
+                self.hits += 1
+                record_cache_lookup("image_result", hit=True)
+                set_attributes(**{"cache.hit": "s3", "response.size": len(data)})
+                return base64.b64encode(data).decode("utf-8")
+            except Exception as e:
+                if "NoSuchKey" not in str(e):
+                    logger.warning(f"Image cache S3 lookup failed: {e}")
+
+        self.misses += 1
+        record_cache_lookup("image_result", hit=False)
+        return None
+
+    def put(self, key: str, image_base64: str):
+        """Store a generated image, evicting old entries past the size bound"""
+        if not self.enabled:
+            return
+
+        data = base64.b64decode(image_base64)
+        self._write_local(key, data)
+
+        if self.s3_bucket:
+            threading.Thread(
+                target=self._put_s3, args=(key, data), daemon=True
+            ).start()
+
+    def _put_s3(self, key: str, data: bytes):
+        try:
+            self._s3().put_object(
+                Bucket=self.s3_bucket, Key=self.s3_prefix + key, Body=data
+            )
+        except Exception as e:
+            logger.warning(f"Image cache S3 upload failed: {e}")
+
+    def _write_local(self, key: str, data: bytes):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so concurrent readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning(f"Image cache write failed: {e}")
+            return
+
+        with self._lock:
+            # Concurrent misses on one key overwrite the same file, so only the
+            # growth over the replaced entry counts towards the total
+            try:
+                replaced_size = os.stat(path).st_size
+            except OSError:
+                replaced_size = 0
+            try:
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Image cache write failed: {e}")
+                os.unlink(tmp_path)
+                return
+            if self._total_bytes is None:
+                self._total_bytes = self._scan()[1]
+            else:
+                self._total_bytes += len(data) - replaced_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        """Return ([(mtime, size, path)], total_bytes) for the cache directory"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries, sum(size for _, size, _ in entries)
+
+    def _evict(self):
+        """Delete least recently used files until the cache is under 90% of its bound"""
+        entries, total = self._scan()
+        entries.sort()
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        self._total_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the tracked cache size"""
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Global instance
+result_cache = ImageResultCache(
+    directory=os.getenv("IMAGE_CACHE_DIR"),
+    max_bytes=int(os.getenv("IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024,
+    s3_bucket=os.getenv("IMAGE_CACHE_S3_BUCKET"),
+    enabled=os.getenv("IMAGE_RESULT_CACHE", "true").lower() == "true",
+)
@@ -1,12 +1,28 @@
-import boto3
 import json
 import uuid
 import os
+import threading
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 import base64
 from io import BytesIO
 
+from botocore.exceptions import ClientError
+
+from .image_codec import image_codec
+from .lazy_init import InitRetry
+from .metrics import instrument_boto_client
+from .image_encoding import (
+    STORAGE_IMAGE_PROFILE,
+    detect_content_type,
+    extension_for,
+    get_profile,
+)
+from .tracing import trace_boto_client, traced
+
+# Secondary indexes queried below; created by setup_aws_resources.py
+REQUIRED_TABLE_INDEXES = ("user-index", "public-generations-index")
+
 
 class StorageService:
     def __init__(self):
@@ -14,101 +30,111 @@ class StorageService:
         self.dynamodb = None
         self.s3_client = None
         self.enabled = False
+        self.table_status = "pending"
         self._initialized = False
+        self._init = InitRetry("Storage service")
 
         # Table and bucket names from environment variables
         self.table_name = os.getenv("DYNAMODB_TABLE_NAME", "influencer-ai-generations")
         self.bucket_name = os.getenv("S3_BUCKET_NAME", "influencer-ai-images")
 
     def _initialize_aws_services(self):
-        """Initialize AWS services (lazy loading)"""
+        """Initialize AWS services (lazy loading, retried with backoff on failure)"""
         if self._initialized:
             return
 
-        try:
-            # Get AWS region from environment
-            aws_region = os.getenv("AWS_REGION", "us-east-1")
-
-            # Initialize AWS services with explicit region
-            self.dynamodb = boto3.resource(
-                "dynamodb",
-                region_name=aws_region,
-                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            )
-            self.s3_client = boto3.client(
-                "s3",
-                region_name=aws_region,
-                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            )
-
-            # Get or create DynamoDB table
-            self.table = self._get_or_create_table()
-            self.enabled = True
-            print(f"✅ Storage service initialized successfully")
+        with self._init.lock:
+            # Another thread may have initialized it while this one waited, and
+            # a recent failure is not retried until its backoff has elapsed
+            if self._initialized or not self._init.ready():
+                return
 
-        except Exception as e:
-            print(f"⚠️  Storage service initialization failed: {str(e)}")
-            print(
-                "📝 Image storage will be disabled. Follow AWS_STORAGE_SETUP.md to enable it."
-            )
-            self.enabled = False
+            try:
+                # Deferred so app startup and /health do not pay for importing boto3
+                import boto3
+
+                # Get AWS region from environment
+                aws_region = os.getenv("AWS_REGION", "us-east-1")
+
+                # Initialize AWS services with explicit region
+                session = boto3.session.Session()
+                self.dynamodb = session.resource(
+                    "dynamodb",
+                    region_name=aws_region,
+                    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                )
+                self.s3_client = session.client(
+                    "s3",
+                    region_name=aws_region,
+                    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                )
+                for client in (self.s3_client, self.dynamodb.meta.client):
+                    instrument_boto_client(client)
+                    trace_boto_client(client)
+
+                # Building the handle makes no AWS call; the schema is verified in the background
+                self.table = self.dynamodb.Table(self.table_name)
+                self.enabled = True
+                threading.Thread(
+                    target=self._verify_table, name="storage-verify", daemon=True
+                ).start()
+                self._initialized = True
+                self._init.succeeded()
+                print(f"✅ Storage service initialized successfully")
+
+            except Exception as e:
+                print(f"⚠️  Storage service initialization failed: {str(e)}")
+                print(
+                    "📝 Image storage is unavailable until a retry succeeds. "
+                    "Follow AWS_STORAGE_SETUP.md if this persists."
+                )
+                self.enabled = False
+                self._init.failed(e)
 
-        self._initialized = True
+    def _verify_table(self):
+        """
+        Check once, off the request path, that the table and its indexes exist
 
-    def _get_or_create_table(self):
-        """Get existing table or create if it doesn't exist"""
+        The table is provisioned by setup_aws_resources.py; if it is missing,
+        storage is disabled rather than created here.
+        """
         try:
-            table = self.dynamodb.Table(self.table_name)
-            # Test if table exists
-            table.load()
-            return table
-        except Exception:
-            # Create table if it doesn't exist
-            return self._create_table()
-
-    def _create_table(self):
-        """Create DynamoDB table for image generations"""
-        table = self.dynamodb.create_table(
-            TableName=self.table_name,
-            KeySchema=[
-                {"AttributeName": "generation_id", "KeyType": "HASH"}  # Partition key
-            ],
-            AttributeDefinitions=[
-                {"AttributeName": "generation_id", "AttributeType": "S"},
-                {"AttributeName": "user_id", "AttributeType": "S"},
-                {"AttributeName": "created_at", "AttributeType": "S"},
-                {
-                    "AttributeName": "is_public",
-                    "AttributeType": "S",
-                },  # Add this for GSI
-            ],
-            GlobalSecondaryIndexes=[
-                {
-                    "IndexName": "user-index",
-                    "KeySchema": [
-                        {"AttributeName": "user_id", "KeyType": "HASH"},
-                        {"AttributeName": "created_at", "KeyType": "RANGE"},
-                    ],
-                    "Projection": {"ProjectionType": "ALL"},
-                },
-                {
-                    "IndexName": "public-generations-index",
-                    "KeySchema": [
-                        {"AttributeName": "is_public", "KeyType": "HASH"},
-                        {"AttributeName": "created_at", "KeyType": "RANGE"},
-                    ],
-                    "Projection": {"ProjectionType": "ALL"},
-                },
-            ],
-            BillingMode="PAY_PER_REQUEST",  # On-demand pricing
-        )
+            description = self.dynamodb.meta.client.describe_table(
+                TableName=self.table_name
+            )["Table"]
+        except Exception as e:
+            if (
+                isinstance(e, ClientError)
+                and e.response["Error"]["Code"] == "ResourceNotFoundException"
+            ):
+                self.enabled = False
+                self.table_status = "missing"
+                print(
+                    f"⚠️  DynamoDB table '{self.table_name}' does not exist, storage is disabled. "
+                    "Run setup_aws_resources.py to create it."
+                )
+            else:
+                # Data-plane calls may still be allowed without DescribeTable
+                self.table_status = "unverified"
+                print(f"⚠️  Could not verify DynamoDB table '{self.table_name}': {str(e)}")
+            return
 
-        # Wait for table to be created
-        table.wait_until_exists()
-        return table
+        existing = {
+            index["IndexName"] for index in description.get("GlobalSecondaryIndexes", [])
+        }
+        missing = [index for index in REQUIRED_TABLE_INDEXES if index not in existing]
+        self.table_status = description.get("TableStatus", "UNKNOWN").lower()
+        if missing:
+            print(
+                f"⚠️  DynamoDB table '{self.table_name}' is missing indexes {missing}. "
+                "Run setup_aws_resources.py to add them."
+            )
+        else:
+            print(f"✅ DynamoDB table '{self.table_name}' verified")
 
+    @traced("storage_service.store_image_generation")
     def store_image_generation(
         self,
         user_id: str,
@@ -142,12 +168,16 @@ class StorageService:
             return {"success": False, "error": "Storage service not available"}
 
         try:
+            image_data, content_type = self._encode_for_storage(image_data)
+
             # Generate unique IDs
             generation_id = str(uuid.uuid4())
-            image_key = f"generations/{user_id}/{generation_id}.png"
+            image_key = (
+                f"generations/{user_id}/{generation_id}.{extension_for(content_type)}"
+            )
 
             # Upload image to S3
-            s3_url = self._upload_image_to_s3(image_data, image_key)
+            s3_url = self._upload_image_to_s3(image_data, image_key, content_type)
 
             # Prepare metadata for DynamoDB
             timestamp = datetime.utcnow().isoformat()
@@ -162,6 +192,8 @@ class StorageService:
                 "llm_model": llm_model,
                 "image_url": s3_url,
                 "image_key": image_key,
+                "content_type": content_type,
+                "image_bytes": len(image_data),
                 "character_data": (
                     json.dumps(character_data) if character_data else None
                 ),
@@ -190,7 +222,30 @@ class StorageService:
             print(f"Error storing image generation: {str(e)}")
             return {"success": False, "error": str(e)}
 
-    def _upload_image_to_s3(self, image_data: bytes, key: str) -> str:
+    @traced("storage_service.encode_for_storage")
+    def _encode_for_storage(self, image_data: bytes):
+        """Re-encode an image with the storage profile; returns (bytes, content_type)"""
+        content_type = detect_content_type(image_data)
+        if STORAGE_IMAGE_PROFILE == "original" or not content_type.startswith("image/"):
+            return image_data, content_type
+
+        try:
+            profile = get_profile(STORAGE_IMAGE_PROFILE)
+            if profile.content_type == content_type:
+                return image_data, content_type
+            encoded = image_codec.transcode(image_data, profile.id)
+        except Exception as e:
+            print(f"Image re-encoding failed, storing original {content_type}: {str(e)}")
+            return image_data, content_type
+
+        # Never store a larger file than the one we were given
+        if len(encoded) >= len(image_data):
+            return image_data, content_type
+        return encoded, profile.content_type
+
+    def _upload_image_to_s3(
+        self, image_data: bytes, key: str, content_type: str = "image/png"
+    ) -> str:
         """Upload image to S3 and return public URL"""
         try:
             # Upload to S3 (without ACL - bucket policy handles public access)
@@ -198,7 +253,9 @@ class StorageService:
                 Bucket=self.bucket_name,
                 Key=key,
                 Body=image_data,
-                ContentType="image/png",
+                ContentType=content_type,
+                # Keys are unique per generation, so the object never changes
+                CacheControl="public, max-age=31536000, immutable",
             )
 
             # Return public URL
@@ -226,6 +283,7 @@ class StorageService:
 
         return generation_data
 
+    @traced("storage_service.get_user_generations")
     def get_user_generations(
         self, user_id: str, limit: int = 20, last_key: Optional[str] = None
     ) -> Dict[str, Any]:
@@ -447,6 +505,7 @@ class StorageService:
             print(f"Error getting user's public generations: {str(e)}")
             return []
 
+    @traced("storage_service.get_public_generations")
     def get_public_generations(
         self, limit: int = 50, last_key: Optional[str] = None
     ) -> Dict[str, Any]:
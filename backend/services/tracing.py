@@ -0,0 +1,279 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import urlsplit
+
+from opentelemetry import context as otel_context
+from opentelemetry import propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "clonefluencer-api"
+
+tracer = trace.get_tracer("clonefluencer")
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class JsonLinesSpanExporter:
+    """Append finished spans to a file, one OpenTelemetry JSON span per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+
+        lines = "".join(
+            json.dumps(json.loads(span.to_json()), separators=(",", ":")) + "\n"
+            for span in spans
+        )
+        try:
+            with self._lock, open(self.path, "a") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.warning(f"Writing spans to {self.path} failed: {e}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def _exporter(name: str):
+    if name == "file":
+        return JsonLinesSpanExporter(
+            os.getenv("TRACING_FILE", "/tmp/clonefluencer-traces.jsonl")
+        )
+    if name == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter()
+    if name == "otlp":
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER: {name}")
+
+
+def configure_tracing():
+    """
+    Install the tracer provider selected by TRACING_EXPORTER (none, file, console, otlp)
+
+    With the default "none" no provider is installed and every span is a
+    no-op, so instrumented code costs next to nothing.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+
+        exporter_name = os.getenv("TRACING_EXPORTER", "none").lower()
+        if exporter_name == "none":
+            return
+
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+            provider = TracerProvider(
+                resource=Resource.create(
+                    {"service.name": SERVICE_NAME, "process.pid": os.getpid()}
+                ),
+                sampler=ParentBased(
+                    TraceIdRatioBased(float(os.getenv("TRACING_SAMPLE_RATIO", "1.0")))
+                ),
+            )
+            provider.add_span_processor(BatchSpanProcessor(_exporter(exporter_name)))
+            trace.set_tracer_provider(provider)
+            _install_requests_tracing()
+            logger.info(f"Tracing enabled with the {exporter_name} exporter")
+        except Exception as e:
+            logger.error(f"Failed to configure tracing, spans are disabled: {e}")
+
+
+def traced(name: Optional[str] = None):
+    """Decorator running a function (sync or async) inside a span"""
+
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.start_as_current_span(span_name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def set_attributes(**attributes):
+    """Set attributes on the current span, skipping None values"""
+    span = trace.get_current_span()
+    if span.is_recording():
+        for key, value in attributes.items():
+            if value is not None:
+                span.set_attribute(key, value)
+
+
+class TracedThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that runs tasks in the submitter's context, keeping their spans parented"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        ctx = contextvars.copy_context()
+        return super().submit(ctx.run, fn, *args, **kwargs)
+
+
+def trace_boto_client(client):
+    """Wrap every operation of a boto3 client in a client span with payload sizes"""
+    service = client.meta.service_model.service_name
+    events = client.meta.events
+
+    def before_call(model, params, context, **kwargs):
+        span = tracer.start_span(f"{service}.{model.name}", kind=SpanKind.CLIENT)
+        if span.is_recording():
+            span.set_attribute("rpc.system", "aws-api")
+            span.set_attribute("rpc.service", service)
+            span.set_attribute("rpc.method", model.name)
+            body = params.get("body")
+            if isinstance(body, (bytes, str)):
+                span.set_attribute("request.size", len(body))
+            model_id = context.get("model_id")
+            if model_id:
+                span.set_attribute("bedrock.model_id", model_id)
+        context["trace_span"] = span
+
+    def after_call(http_response, parsed, context, **kwargs):
+        span = context.pop("trace_span", None)
+        if span is None:
+            return
+        if span.is_recording():
+            span.set_attribute("http.status_code", http_response.status_code)
+            # Streaming bodies (e.g. invoke_model) must not be read here
+            length = http_response.headers.get("content-length")
+            if length:
+                span.set_attribute("response.size", int(length))
+            if http_response.status_code >= 400:
+                error = parsed.get("Error", {}).get("Code", "error")
+                span.set_status(Status(StatusCode.ERROR, error))
+        span.end()
+
+    def after_call_error(exception, context, **kwargs):
+        span = context.pop("trace_span", None)
+        if span is None:
+            return
+        span.record_exception(exception)
+        span.set_status(Status(StatusCode.ERROR, str(exception)))
+        span.end()
+
+    def remember_model_id(params, context, **kwargs):
+        if "modelId" in params:
+            context["model_id"] = params["modelId"]
+
+    events.register("provide-client-params", remember_model_id)
+    events.register("before-call", before_call)
+    events.register("after-call", after_call)
+    events.register("after-call-error", after_call_error)
+    return client
+
+
+def _install_requests_tracing():
+    """Wrap requests.Session.send so FLUX and image fetches get client spans"""
+    import requests
+
+    send = requests.Session.send
+    if getattr(send, "_traced", False):
+        return
+
+    @functools.wraps(send)
+    def traced_send(session, request, **kwargs):
+        url = urlsplit(request.url)
+        with tracer.start_as_current_span(
+            f"HTTP {request.method} {url.netloc}", kind=SpanKind.CLIENT
+        ) as span:
+            if span.is_recording():
+                span.set_attribute("http.method", request.method)
+                # Query strings may carry keys or ids, keep only the path
+                span.set_attribute("http.url", f"{url.scheme}://{url.netloc}{url.path}")
+                span.set_attribute("request.size", len(request.body or b""))
+            response = send(session, request, **kwargs)
+            if span.is_recording():
+                span.set_attribute("http.status_code", response.status_code)
+                length = response.headers.get("content-length")
+                if length:
+                    span.set_attribute("response.size", int(length))
+                if response.status_code >= 400:
+                    span.set_status(Status(StatusCode.ERROR))
+            return response
+
+    traced_send._traced = True
+    requests.Session.send = traced_send
+
+
+def instrument_app(app):
+    """Start a server span per request, continuing any incoming traceparent"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_span():
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        parent = propagate.extract(request.headers)
+        span = tracer.start_span(
+            f"{request.method} {rule}", context=parent, kind=SpanKind.SERVER
+        )
+        if span.is_recording():
+            span.set_attribute("http.method", request.method)
+            span.set_attribute("http.route", rule)
+            span.set_attribute("request.size", request.content_length or 0)
+        g.trace_span = span
+        g.trace_token = otel_context.attach(trace.set_span_in_context(span, parent))
+
+    @app.after_request
+    def annotate_request_span(response):
+        span = g.get("trace_span")
+        if span is not None and span.is_recording():
+            span.set_attribute("http.status_code", response.status_code)
+            if not response.is_streamed:
+                span.set_attribute("response.size", response.calculate_content_length() or 0)
+            if response.status_code >= 500:
+                span.set_status(Status(StatusCode.ERROR))
+        return response
+
+    @app.teardown_request
+    def end_request_span(exception):
+        span = g.pop("trace_span", None)
+        token = g.pop("trace_token", None)
+        if span is None:
+            return
+        if exception is not None:
+            span.record_exception(exception)
+            span.set_status(Status(StatusCode.ERROR, str(exception)))
+        span.end()
+        if token is not None:
+            otel_context.detach(token)
@@ -0,0 +1,102 @@
+import importlib
+import io
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Modules the app imports on first use rather than at startup
+DEFERRED_MODULES = ("boto3", "botocore.config", "requests", "PIL.Image")
+
+
+def import_deferred_modules():
+    """Import DEFERRED_MODULES; safe before forking as none opens connections"""
+    for module in DEFERRED_MODULES:
+        importlib.import_module(module)
+
+
+def _warm_bedrock():
+    from .bedrock_service import bedrock_service
+    from .image_generation_service import image_service
+
+    # bedrock-runtime has no free no-op call, so only the clients are built;
+    # that covers loading the service models, which is most of the first-call cost
+    bedrock_service.is_available()
+    image_service._initialize_bedrock_client()
+
+
+def _warm_storage():
+    from .storage_service import storage_service
+
+    storage_service._initialize_aws_services()
+    if storage_service.enabled:
+        # Opens a pooled TLS connection to S3 for the first upload
+        storage_service.s3_client.head_bucket(Bucket=storage_service.bucket_name)
+
+
+def _warm_result_cache():
+    from .result_cache import result_cache
+
+    if result_cache.enabled and result_cache.s3_bucket:
+        result_cache._s3().head_bucket(Bucket=result_cache.s3_bucket)
+
+
+def _warm_image_codec():
+    from PIL import Image
+
+    from .image_codec import image_codec
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buffer, format="PNG")
+    # Spawns a worker process and imports Pillow in it
+    image_codec.transcode(buffer.getvalue(), "flux_input")
+
+
+WARMUP_STEPS: Dict[str, Callable[[], None]] = {
+    "imports": import_deferred_modules,
+    "bedrock": _warm_bedrock,
+    "storage": _warm_storage,
+    "result_cache": _warm_result_cache,
+    "image_codec": _warm_image_codec,
+}
+
+
+def _run_steps(timings: Dict[str, float]):
+    for name, step in WARMUP_STEPS.items():
+        started_at = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+        timings[name] = round((time.perf_counter() - started_at) * 1000, 1)
+
+
+def warm_up(timeout: Optional[float] = None) -> Dict[str, float]:
+    """
+    Import deferred modules and build AWS clients and connections up front
+
+    Meant for gunicorn's post_worker_init hook, so the first requests a worker
+    serves do not pay for them. Steps that fail are logged and skipped; steps
+    still running after the timeout finish in the background so a slow AWS
+    endpoint cannot hold the worker past its boot timeout. Returns milliseconds
+    per completed step.
+    """
+    if timeout is None:
+        timeout = float(os.getenv("WARMUP_TIMEOUT", "10"))
+
+    timings: Dict[str, float] = {}
+    started_at = time.perf_counter()
+    thread = threading.Thread(target=_run_steps, args=(timings,), name="warmup", daemon=True)
+    thread.start()
+    thread.join(timeout)
+
+    elapsed = round((time.perf_counter() - started_at) * 1000, 1)
+    if thread.is_alive():
+        logger.warning(f"Warm-up still running after {elapsed}ms, serving anyway: {timings}")
+    else:
+        logger.info(f"Warm-up finished in {elapsed}ms: {timings}")
+    return dict(timings)
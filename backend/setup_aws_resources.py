@@ -14,8 +14,37 @@ import time
 from botocore.exceptions import ClientError
 
 
+# Secondary indexes the storage service queries; the service only verifies
+# they exist, so any change here must be applied by re-running this script
+GENERATIONS_TABLE_INDEXES = [
+    {
+        "IndexName": "user-index",
+        "KeySchema": [
+            {"AttributeName": "user_id", "KeyType": "HASH"},
+            {"AttributeName": "created_at", "KeyType": "RANGE"},
+        ],
+        "Projection": {"ProjectionType": "ALL"},
+    },
+    {
+        "IndexName": "public-generations-index",
+        "KeySchema": [
+            {"AttributeName": "is_public", "KeyType": "HASH"},
+            {"AttributeName": "created_at", "KeyType": "RANGE"},
+        ],
+        "Projection": {"ProjectionType": "ALL"},
+    },
+]
+
+GENERATIONS_TABLE_ATTRIBUTES = [
+    {"AttributeName": "generation_id", "AttributeType": "S"},
+    {"AttributeName": "user_id", "AttributeType": "S"},
+    {"AttributeName": "created_at", "AttributeType": "S"},
+    {"AttributeName": "is_public", "AttributeType": "S"},
+]
+
+
 def create_dynamodb_table():
-    """Create DynamoDB table for image generations"""
+    """Create the DynamoDB table for image generations, or add missing indexes"""
     print("🗄️  Creating DynamoDB table...")
 
     table_name = os.getenv("DYNAMODB_TABLE_NAME", "influencer-ai-generations")
@@ -27,36 +56,19 @@ def create_dynamodb_table():
         try:
             response = dynamodb.describe_table(TableName=table_name)
             print(f"✅ Table '{table_name}' already exists")
-            return True
+            return add_missing_indexes(dynamodb, response["Table"])
         except ClientError as e:
             if e.response["Error"]["Code"] != "ResourceNotFoundException":
                 print(f"❌ Error checking table: {e}")
                 return False
 
         # Create the table
-        table = dynamodb.create_table(
+        dynamodb.create_table(
             TableName=table_name,
             KeySchema=[{"AttributeName": "generation_id", "KeyType": "HASH"}],
-            AttributeDefinitions=[
-                {"AttributeName": "generation_id", "AttributeType": "S"},
-                {"AttributeName": "user_id", "AttributeType": "S"},
-                {"AttributeName": "created_at", "AttributeType": "S"},
-            ],
-            GlobalSecondaryIndexes=[
-                {
-                    "IndexName": "user-index",
-                    "KeySchema": [
-                        {"AttributeName": "user_id", "KeyType": "HASH"},
-                        {"AttributeName": "created_at", "KeyType": "RANGE"},
-                    ],
-                    "Projection": {"ProjectionType": "ALL"},
-                    "ProvisionedThroughput": {
-                        "ReadCapacityUnits": 5,
-                        "WriteCapacityUnits": 5,
-                    },
-                }
-            ],
-            ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
+            AttributeDefinitions=GENERATIONS_TABLE_ATTRIBUTES,
+            GlobalSecondaryIndexes=GENERATIONS_TABLE_INDEXES,
+            BillingMode="PAY_PER_REQUEST",  # On-demand pricing
         )
 
         print(f"⏳ Waiting for table '{table_name}' to be created...")
@@ -73,6 +85,53 @@ def create_dynamodb_table():
         return False
 
 
+def add_missing_indexes(dynamodb, table_description):
+    """Create any secondary index the app needs that an existing table lacks"""
+    table_name = table_description["TableName"]
+    existing = {
+        index["IndexName"]
+        for index in table_description.get("GlobalSecondaryIndexes", [])
+    }
+    provisioned = (
+        table_description.get("BillingModeSummary", {}).get("BillingMode")
+        != "PAY_PER_REQUEST"
+    )
+
+    for index in GENERATIONS_TABLE_INDEXES:
+        if index["IndexName"] in existing:
+            continue
+
+        print(f"➕ Adding index '{index['IndexName']}' to '{table_name}'...")
+        create = dict(index)
+        if provisioned:
+            create["ProvisionedThroughput"] = {
+                "ReadCapacityUnits": 5,
+                "WriteCapacityUnits": 5,
+            }
+        try:
+            dynamodb.update_table(
+                TableName=table_name,
+                AttributeDefinitions=GENERATIONS_TABLE_ATTRIBUTES,
+                GlobalSecondaryIndexUpdates=[{"Create": create}],
+            )
+            # DynamoDB accepts one index creation at a time
+            waiter = dynamodb.get_waiter("table_exists")
+            while True:
+                waiter.wait(TableName=table_name)
+                indexes = dynamodb.describe_table(TableName=table_name)["Table"].get(
+                    "GlobalSecondaryIndexes", []
+                )
+                if all(i.get("IndexStatus") == "ACTIVE" for i in indexes):
+                    break
+                time.sleep(10)
+            print(f"✅ Index '{index['IndexName']}' is active")
+        except ClientError as e:
+            print(f"❌ Failed to add index '{index['IndexName']}': {e}")
+            return False
+
+    return True
+
+
 def create_s3_bucket():
     """Create S3 bucket for image storage"""
     print("\n🪣 Creating S3 bucket...")